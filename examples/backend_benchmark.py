@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Backend Benchmark - PyTorch vs ONNX Runtime
+Ajaa day03-promptit BatchGeneratorin kautta (sama polku kuin
+HFLocalProvider day03:n dispatchissa) kummallakin backendillä
+ja vertaa tokeneita sekunnissa. Välimuistit ovat pois päältä.
+
+Käyttö: python backend_benchmark.py [gpt2|distilgpt2]
+"""
+
+import sys
+import time
+
+from experiment_spec import iter_jobs, spec_path
+from generation_cache import DEFAULT_SEED
+from hf_generation import BatchGenerator
+from model_registry import BACKENDS, get_registry
+
+BATCH_SIZES = (1, 8)
+MAX_NEW_TOKENS = 50
+
+
+def benchmark_requests():
+    """Day03-specin uniikit promptit, sama max_new_tokens kaikille"""
+    prompts = []
+    for job in iter_jobs(spec_path('day03_advanced')):
+        if job['prompt'] not in prompts:
+            prompts.append(job['prompt'])
+    return [
+        {'prompt': prompt, 'temperature': 0.7, 'max_new_tokens': MAX_NEW_TOKENS}
+        for prompt in prompts
+    ]
+
+
+def run_backend(model_name, backend, requests):
+    """Tokenit/s per batch-koko yhdellä backendillä"""
+    model, tokenizer = get_registry().model_and_tokenizer(model_name, backend=backend)
+    results = []
+    for batch_size in BATCH_SIZES:
+        generator = BatchGenerator(model, tokenizer, batch_size=batch_size, seed=DEFAULT_SEED)
+        generator.generate(requests[:1])  # Lämmittely
+        generator.batch_stats.clear()
+
+        start = time.perf_counter()
+        generator.generate(requests)
+        elapsed = time.perf_counter() - start
+
+        tokens = sum(stats['generated_tokens'] for stats in generator.batch_stats)
+        results.append({
+            'backend': backend,
+            'batch_size': batch_size,
+            'prompts': len(requests),
+            'generated_tokens': tokens,
+            'elapsed_s': elapsed,
+            'tokens_per_s': tokens / elapsed if elapsed > 0 else 0.0,
+        })
+    return results
+
+
+def main():
+    model_name = sys.argv[1] if len(sys.argv) > 1 else "gpt2"
+    requests = benchmark_requests()
+    print(f"🏁 Backend benchmark: {model_name}, {len(requests)} promptia × {MAX_NEW_TOKENS} tokenia")
+
+    results = []
+    for backend in BACKENDS:
+        print(f"\n⚙️  === {backend.upper()} ===")
+        try:
+            results.extend(run_backend(model_name, backend, requests))
+        except ImportError as e:
+            print(f"⚠️  {backend} ohitetaan: {e}")
+
+    print("\n📊 === TOKENIT / SEKUNTI ===")
+    baseline = {r['batch_size']: r['tokens_per_s'] for r in results if r['backend'] == 'torch'}
+    for r in results:
+        speedup = r['tokens_per_s'] / baseline[r['batch_size']] if baseline.get(r['batch_size']) else 0.0
+        print(f"   {r['backend']:<6} batch {r['batch_size']:>2}: {r['tokens_per_s']:7.1f} tok/s "
+              f"({r['generated_tokens']} tokenia {r['elapsed_s']:.1f}s, {speedup:.2f}x vs torch)")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,36 +4,75 @@ Edistyneet prompt-tekniikat ja parameter tuning
 """
 
 import os
-import pandas as pd
 import json
+import time
 from datetime import datetime
-from transformers import GPT2LMHeadModel, GPT2Tokenizer
-import torch
+import pandas as pd
 from dotenv import load_dotenv
 
+from experiment_spec import checkpoint_id, iter_jobs, skip_completed, spec_path
+from log_analytics import print_report, summarize_log
+from model_registry import default_backend, default_inference_mode, get_registry
+from providers import HFLocalProvider, ProviderPool, get_provider
+from quality_metrics import (QUALITY_COLUMNS, add_quality_metrics, default_quality_samples, default_scorer_model,
+                             load_sweep, print_ranking, rank_variants)
+from usage_accounting import BudgetExceeded, UsageTracker
+from result_sink import DAY03_LOG_PATH, DAY03_LOG_SCHEMA, columnar_dir_for, open_sink
+
 # Lataa environment variables
 load_dotenv()
 
 class AdvancedPromptTester:
-    def __init__(self):
+    # Parameter sweeps that get quality metrics (other categories are logged without them)
+    QUALITY_CATEGORIES = ('temperature_variation', 'ab_testing')
+
+    # Optional per-job columns: prompt truncation + streaming latency
+    DETAIL_COLUMNS = ('prompt_tokens', 'truncated_tokens', 'truncation',
+                      'ttft_s', 'inter_token_ms', 'tokens_per_s', 'latency_s',
+                      'completion_tokens', 'cost_usd') + QUALITY_COLUMNS
+    
+    def __init__(self, spec=None, resume=True, inference_mode=None, backend=None, quality_samples=None):
         print("🚀 DAY 3 - Advanced Prompt Engineering")
         print("="*60)
         
-        # Initialize models
-        self.setup_huggingface()
+        # Initialize models (Hugging Face loads lazily, only if some job still has to run)
+        # inference_mode: fp32 / bf16 / int8 (default: INFERENCE_MODE from .env)
+        self.inference_mode = inference_mode or default_inference_mode()
+        # backend: torch / onnx (default: GENERATION_BACKEND from .env)
+        self.backend = backend or default_backend()
+        # Jobs are dispatched by model name: 'gpt2' (local), 'openai:...', 'fake:...'
+        # Token/cost accounting; the run stops before RUN_BUDGET_USD would be exceeded
+        self.usage = UsageTracker()
+        self.providers = ProviderPool(self.create_provider, usage=self.usage)
         self.setup_openai()
         
+        # Prompts and parameters live in examples/experiments/day03_advanced.yaml
+        self.spec_path = spec or spec_path('day03_advanced')
+        # Samples per sweep configuration for self-BLEU (opt-in: QUALITY_SAMPLES, default 1)
+        self.quality_samples = quality_samples or default_quality_samples()
+        
         # Results storage
         self.results = []
-        self.csv_path = "logs/day03_advanced_prompts.csv"
+        self.csv_path = DAY03_LOG_PATH
+        self.sink = open_sink(
+            self.csv_path,
+            DAY03_LOG_SCHEMA,
+            columnar_dir=columnar_dir_for('day03_advanced_prompts')
+        )
+        
+        # Checkpoint: job IDs already logged next to the results (<csv>.done)
+        self.completed = self.sink.completed_job_ids() if resume else set()
+        self.skipped_jobs = 0
         
-    def setup_huggingface(self):
-        """Setup Hugging Face model"""
-        print("🤗 Alustetaan Hugging Face GPT2...")
-        self.tokenizer = GPT2Tokenizer.from_pretrained('gpt2')
-        self.model = GPT2LMHeadModel.from_pretrained('gpt2')
-        self.tokenizer.pad_token = self.tokenizer.eos_token
-        print("✅ GPT2 valmis!")
+    def create_provider(self, prefix, name):
+        """Provider factory: local models use this tester's inference mode and backend"""
+        if prefix != 'hf':
+            return get_provider(f"{prefix}:{name}")
+        print(f"🤗 Alustetaan Hugging Face {name} ({self.inference_mode}, {self.backend})...")
+        # Jaettu rekisteri: sama malli kuin playgroundin pipelineissa
+        provider = HFLocalProvider(name, mode=self.inference_mode, backend=self.backend)
+        print(f"✅ {name} valmis!")
+        return provider
         
     def setup_openai(self):
         """Setup OpenAI (jos käytettävissä)"""
@@ -42,8 +81,7 @@ class AdvancedPromptTester:
         
         if api_key and api_key != "your_openai_api_key_here":
             try:
-                from openai import OpenAI
-                self.openai_client = OpenAI(api_key=api_key)
+                import openai  # noqa: F401 - calls go through openai_async (AsyncOpenAI)
                 self.openai_available = True
                 print("✅ OpenAI API valmis (säästäväiseen käyttöön)")
             except Exception as e:
@@ -55,85 +93,27 @@ class AdvancedPromptTester:
         """Test 1: Temperature parameter tuning"""
         print("\n🌡️  === TEST 1: TEMPERATURE VARIATIONS ===")
         
-        base_prompt = "The future of artificial intelligence will"
-        temperatures = [0.1, 0.5, 1.0, 1.5]
-        
-        for temp in temperatures:
-            print(f"📊 Testing temperature {temp}...")
-            
-            # Hugging Face test
-            response = self.generate_hf_response(
-                base_prompt, 
-                temperature=temp,
-                max_new_tokens=100
-            )
-            
-            self.log_result({
-                'test_category': 'temperature_variation',
-                'prompt': base_prompt,
-                'temperature': temp,
-                'model': 'gpt2',
-                'response': response,
-                'notes': f'Temperature {temp} test - creativity vs consistency'
-            })
-            
-            print(f"   Temperature {temp}: {response[:100]}...")
+        jobs, responses = self.run_spec_jobs('temperature_variation', samples=self.quality_samples)
         
+        for job, response in zip(jobs, responses):
+            print(f"   Temperature {job['params']['temperature']}: {response[:100]}...")
+        
+        # Creativity vs consistency per temperature (all logged runs)
+        self.sink.flush()
+        print_ranking(rank_variants(load_sweep(self.csv_path, DAY03_LOG_SCHEMA, 'temperature_variation'),
+                                    by='temperature'), title="TEMPERATURE QUALITY")
         print("✅ Temperature tests completed!")
     
     def test_chain_of_thought(self):
         """Test 2: Chain-of-thought prompting"""
         print("\n🧠 === TEST 2: CHAIN-OF-THOUGHT PROMPTING ===")
         
-        # Mathematical reasoning test
-        math_problems = [
-            {
-                'problem': "A store sells apples for $2 per kg. If I buy 3.5 kg, how much do I pay?",
-                'cot_prompt': "A store sells apples for $2 per kg. If I buy 3.5 kg, how much do I pay?\n\nLet me think step by step:\n1) Price per kg = $2\n2) Amount bought = 3.5 kg\n3) Total cost = price per kg × amount\n4) Total cost = $2 × 3.5 = $7\n\nTherefore, I pay $7."
-            },
-            {
-                'problem': "If a train travels 60 km in 45 minutes, what is its speed in km/h?",
-                'cot_prompt': "If a train travels 60 km in 45 minutes, what is its speed in km/h?\n\nLet me work through this step by step:\n1) Distance = 60 km\n2) Time = 45 minutes = 45/60 hours = 0.75 hours\n3) Speed = Distance ÷ Time\n4) Speed = 60 km ÷ 0.75 hours = 80 km/h\n\nThe train's speed is 80 km/h."
-            }
-        ]
+        # Direct + CoT promptit samoilla parametreilla -> yksi batch
+        jobs, responses = self.run_spec_jobs('direct_reasoning', 'chain_of_thought')
         
-        for i, problem in enumerate(math_problems, 1):
-            print(f"📊 Testing CoT problem {i}...")
-            
-            # Direct prompt without CoT
-            direct_response = self.generate_hf_response(
-                problem['problem'],
-                temperature=0.3,
-                max_new_tokens=150
-            )
-            
-            self.log_result({
-                'test_category': 'direct_reasoning',
-                'prompt': problem['problem'],
-                'temperature': 0.3,
-                'model': 'gpt2',
-                'response': direct_response,
-                'notes': 'Direct reasoning without chain-of-thought'
-            })
-            
-            # Chain-of-thought prompt
-            cot_response = self.generate_hf_response(
-                problem['cot_prompt'] + "\n\nNow solve a similar problem:",
-                temperature=0.3,
-                max_new_tokens=150
-            )
-            
-            self.log_result({
-                'test_category': 'chain_of_thought',
-                'prompt': problem['cot_prompt'] + "\n\nNow solve a similar problem:",
-                'temperature': 0.3,
-                'model': 'gpt2',
-                'response': cot_response,
-                'notes': 'Chain-of-thought reasoning with step-by-step breakdown'
-            })
-            
-            print(f"   Direct: {direct_response[:80]}...")
-            print(f"   CoT: {cot_response[:80]}...")
+        for job, response in zip(jobs, responses):
+            label = "CoT" if job['category'] == 'chain_of_thought' else "Direct"
+            print(f"   {label}: {response[:80]}...")
         
         print("✅ Chain-of-thought tests completed!")
     
@@ -141,46 +121,10 @@ class AdvancedPromptTester:
         """Test 3: System vs User message optimization"""
         print("\n👤 === TEST 3: SYSTEM VS USER ROLES ===")
         
-        scenarios = [
-            {
-                'task': 'Creative writing',
-                'system_prompt': "You are a creative writing assistant. Write engaging, descriptive content with vivid imagery.",
-                'user_prompt': "Write a short description of a mysterious forest."
-            },
-            {
-                'task': 'Technical explanation',
-                'system_prompt': "You are a technical expert. Explain complex topics clearly and accurately with examples.",
-                'user_prompt': "Explain what machine learning is."
-            },
-            {
-                'task': 'Business analysis',
-                'system_prompt': "You are a business consultant. Provide strategic, data-driven insights.",
-                'user_prompt': "What are the main benefits of remote work for companies?"
-            }
-        ]
+        jobs, responses = self.run_spec_jobs('system_user_roles')
         
-        for scenario in scenarios:
-            print(f"📊 Testing {scenario['task']}...")
-            
-            # System + User combined (simulated with context)
-            combined_prompt = f"System: {scenario['system_prompt']}\nUser: {scenario['user_prompt']}\nAssistant:"
-            
-            response = self.generate_hf_response(
-                combined_prompt,
-                temperature=0.7,
-                max_new_tokens=200
-            )
-            
-            self.log_result({
-                'test_category': 'system_user_roles',
-                'prompt': combined_prompt,
-                'temperature': 0.7,
-                'model': 'gpt2',
-                'response': response,
-                'notes': f'System+User role test for {scenario["task"]}'
-            })
-            
-            print(f"   {scenario['task']}: {response[:100]}...")
+        for job, response in zip(jobs, responses):
+            print(f"   {job['task']}: {response[:100]}...")
         
         print("✅ System vs User role tests completed!")
     
@@ -188,174 +132,208 @@ class AdvancedPromptTester:
         """Test 4: A/B parameter testing"""
         print("\n🧪 === TEST 4: A/B PARAMETER TESTING ===")
         
-        base_prompt = "Write a professional email to a client about project completion."
+        # Streaming: variantteja verrataan myös latenssin (TTFT, tok/s) perusteella
+        jobs, responses = self.run_spec_jobs('ab_testing', stream=True, samples=self.quality_samples)
         
-        # 6 parameter variants
-        variants = [
-            {'name': 'Conservative', 'temp': 0.2, 'top_p': 0.8, 'max_tokens': 150},
-            {'name': 'Balanced', 'temp': 0.5, 'top_p': 0.9, 'max_tokens': 200},
-            {'name': 'Creative', 'temp': 0.8, 'top_p': 0.95, 'max_tokens': 250},
-            {'name': 'Focused', 'temp': 0.3, 'top_p': 0.7, 'max_tokens': 100},
-            {'name': 'Diverse', 'temp': 1.0, 'top_p': 0.95, 'max_tokens': 300},
-            {'name': 'Precise', 'temp': 0.1, 'top_p': 0.5, 'max_tokens': 120}
-        ]
-        
-        for variant in variants:
-            print(f"📊 Testing {variant['name']} variant...")
-            
-            response = self.generate_hf_response(
-                base_prompt,
-                temperature=variant['temp'],
-                max_new_tokens=variant['max_tokens']
-            )
-            
-            self.log_result({
-                'test_category': 'ab_testing',
-                'prompt': base_prompt,
-                'temperature': variant['temp'],
-                'top_p': variant.get('top_p', 0.9),
-                'max_tokens': variant['max_tokens'],
-                'variant_name': variant['name'],
-                'model': 'gpt2',
-                'response': response,
-                'notes': f'A/B test variant: {variant["name"]}'
-            })
-            
-            print(f"   {variant['name']}: {response[:80]}...")
+        for job, response in zip(jobs, responses):
+            print(f"   {job['variant_name']}: {response[:80]}...")
         
+        # Variants ranked by perplexity, distinct-2 and repetition (all logged runs)
+        self.sink.flush()
+        print_ranking(rank_variants(load_sweep(self.csv_path, DAY03_LOG_SCHEMA, 'ab_testing')),
+                      title="A/B VARIANT RANKING")
         print("✅ A/B parameter testing completed!")
     
     def test_advanced_patterns(self):
         """Test 5: Advanced prompting patterns"""
         print("\n🎨 === TEST 5: ADVANCED PROMPT PATTERNS ===")
         
-        # Meta-prompting
-        meta_prompt = """You are an expert prompt engineer. Create a prompt that would generate a compelling product description for a smart home device.
-
-The prompt should include:
-1. Clear instructions
-2. Target audience specification  
-3. Key features to highlight
-4. Tone and style guidelines
-
-Generated prompt:"""
-        
-        meta_response = self.generate_hf_response(
-            meta_prompt,
-            temperature=0.6,
-            max_new_tokens=200
-        )
+        # Meta-prompting + few-shot chain-of-thought
+        self.run_spec_jobs('meta_prompting', 'few_shot_cot')
         
-        self.log_result({
-            'test_category': 'meta_prompting',
-            'prompt': meta_prompt,
-            'temperature': 0.6,
-            'model': 'gpt2',
-            'response': meta_response,
-            'notes': 'Meta-prompting: creating prompts about creating prompts'
-        })
-        
-        # Few-shot chain-of-thought
-        few_shot_cot = """Examples of step-by-step problem solving:
-
-Problem: Calculate 15% tip on $48 bill
-Solution: 
-Step 1: Convert 15% to decimal: 15% = 0.15
-Step 2: Multiply bill by tip rate: $48 × 0.15 = $7.20
-Answer: The tip is $7.20
+        print("✅ Advanced pattern tests completed!")
+    
+    def run_spec_jobs(self, *categories, stream=False, samples=None):
+        """Load the categories' jobs from the experiment spec, generate and log the missing ones
 
-Problem: How many hours in 3 days and 4 hours?
-Solution:
-Step 1: Convert days to hours: 3 days = 3 × 24 = 72 hours  
-Step 2: Add extra hours: 72 + 4 = 76 hours
-Answer: 76 hours
+        samples overrides the spec's samples per configuration (None = as in the spec).
+        """
+        # Local models: inference mode and backend are part of the checkpoint key
+        all_jobs = [
+            dict(job, job_id=checkpoint_id(job, inference_mode=self.inference_mode, backend=self.backend))
+            for job in iter_jobs(self.spec_path, categories, samples=samples)
+        ]
+        jobs = list(skip_completed(all_jobs, self.completed))
+        self.skipped_jobs += len(all_jobs) - len(jobs)
+        if not jobs:
+            print(f"✅ All {len(all_jobs)} prompts already done ({', '.join(categories)})")
+            return [], []
+        print(f"📊 Testing {len(jobs)} prompts ({', '.join(categories)})...")
+        
+        if stream:
+            results, responses = [], []
+            for job in jobs:
+                try:
+                    self.providers.reserve([job])
+                except BudgetExceeded as e:
+                    print(f"🛑 {e}")
+                    break
+                metrics = {}
+                start = time.perf_counter()
+                response = self.generate_stream(job, metrics)
+                metrics.setdefault('latency_s', time.perf_counter() - start)
+                self.providers.record(job, metrics)
+                results.append(metrics)
+                responses.append(response)
+            jobs = jobs[:len(responses)]
+        else:
+            # Each provider gets one batch; different providers run concurrently
+            try:
+                results = self.providers.dispatch(jobs)
+            except BudgetExceeded as e:
+                print(f"🛑 {e}")
+                return [], []
+            responses = [result['text'] for result in results]
+        if not jobs:
+            return [], []
+        
+        # Quality metrics over the whole sweep at once, logged as columns
+        quality = self.score_quality(jobs, responses)
+        for job, response, details, scores in zip(jobs, responses, results, quality):
+            self.log_job(job, response, {**details, **scores})
+        
+        return jobs, responses
+    
+    def quality_scorer(self):
+        """Reference LM for logprob/perplexity (QUALITY_SCORER_MODEL, off by default); None disables"""
+        name = default_scorer_model()
+        if not name:
+            return None
+        provider = self.providers.get(name)
+        return getattr(provider, 'score', None)
+    
+    def score_quality(self, jobs, responses):
+        """Repetition, distinct-1/2, self-BLEU and logprob/perplexity for a sweep's rows
 
-Problem: A car uses 8L fuel for 100km. How much for 350km?
-Solution:"""
-        
-        few_shot_response = self.generate_hf_response(
-            few_shot_cot,
-            temperature=0.4,
-            max_new_tokens=150
-        )
-        
-        self.log_result({
-            'test_category': 'few_shot_cot',
-            'prompt': few_shot_cot,
-            'temperature': 0.4,
-            'model': 'gpt2',
-            'response': few_shot_response,
-            'notes': 'Few-shot chain-of-thought with mathematical reasoning'
-        })
-        
-        print("✅ Advanced pattern tests completed!")
+        Only QUALITY_CATEGORIES are scored; other rows get no quality columns.
+        """
+        sweep = [index for index, job in enumerate(jobs) if job['category'] in self.QUALITY_CATEGORIES]
+        quality = [{} for _ in jobs]
+        if not sweep:
+            return quality
+        jobs = [jobs[index] for index in sweep]
+        responses = [responses[index] for index in sweep]
+        frame = pd.DataFrame([{
+            'category': job['category'],
+            'model': job['model'],
+            'prompt': job['prompt'],
+            'temperature': job['params'].get('temperature'),
+            'top_p': job['params'].get('top_p'),
+            'max_tokens': job['params'].get('max_new_tokens'),
+            'variant_name': job.get('variant_name'),
+            'response': response,
+        } for job, response in zip(jobs, responses)])
+        try:
+            scored = add_quality_metrics(frame, scorer=self.quality_scorer())
+        except Exception as e:
+            print(f"⚠️  Logprob scoring failed ({e}) - text metrics only")
+            scored = add_quality_metrics(frame)
+        scored = scored[list(QUALITY_COLUMNS)].astype(object)
+        for index, scores in zip(sweep, scored.where(scored.notna(), None).to_dict('records')):
+            quality[index] = scores
+        return quality
+    
+    def log_job(self, job, response, details=None):
+        """Log a spec job's result in the same row shape as before (+ truncation/streaming details)"""
+        params = job['params']
+        result_data = {
+            'test_category': job['category'],
+            'prompt': job['prompt'],
+            'temperature': params.get('temperature'),
+            'model': job['model'],
+            'response': response,
+            'notes': job['notes']
+        }
+        if 'variant_name' in job:
+            result_data.update({
+                'top_p': params.get('top_p', 0.9),
+                'max_tokens': params.get('max_new_tokens'),
+                'variant_name': job['variant_name']
+            })
+        for key in self.DETAIL_COLUMNS:
+            if details and key in details:
+                result_data[key] = details[key]
+        # Failed rows are logged but not checkpointed: a resumed run retries them
+        failed = str(response).startswith('Error:')
+        self.log_result(result_data, job_id=None if failed else job['job_id'])
     
-    def generate_hf_response(self, prompt, temperature=0.7, max_new_tokens=150):
-        """Generate response using Hugging Face model"""
+    def generate_stream(self, job, metrics=None):
+        """Stream one job's response from its provider; latency metrics are written into `metrics`"""
+        provider = self.providers.get(job['model'])
+        request = dict(job['params'], prompt=job['prompt'])
+        pieces = []
         try:
-            inputs = self.tokenizer.encode(prompt, return_tensors="pt", truncation=True, max_length=500)
-            
-            with torch.no_grad():
-                outputs = self.model.generate(
-                    inputs,
-                    max_new_tokens=max_new_tokens,
-                    temperature=temperature,
-                    do_sample=True,
-                    pad_token_id=self.tokenizer.eos_token_id,
-                    attention_mask=torch.ones_like(inputs)
-                )
-            
-            response = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-            # Remove original prompt from response
-            response = response[len(prompt):].strip()
-            
-            return response
-        
+            for piece in provider.stream(request, metrics):
+                pieces.append(piece)
         except Exception as e:
             return f"Error: {str(e)}"
+        
+        response = ''.join(pieces).strip()
+        if metrics and metrics.get('ttft_s') is not None and 'tokens_per_s' in metrics:
+            print(f"   ⏱️  TTFT {metrics['ttft_s'] * 1000:.0f} ms, "
+                  f"{metrics['tokens_per_s']:.1f} tok/s ({metrics['generated_tokens']} tokenia)")
+        return response
     
-    def log_result(self, result_data):
-        """Log result to CSV and memory"""
+    def log_result(self, result_data, job_id=None):
+        """Log result to CSV and memory (job_id is checkpointed once the row is on disk)"""
         result_data['timestamp'] = datetime.now().isoformat()
         result_data['day'] = 3
+        result_data['inference_mode'] = self.inference_mode
+        result_data['backend'] = self.backend
         
         # Add to memory
         self.results.append(result_data)
         
-        # Save to CSV
-        df = pd.DataFrame([result_data])
-        
-        # Append to existing CSV or create new
-        try:
-            existing_df = pd.read_csv(self.csv_path)
-            df = pd.concat([existing_df, df], ignore_index=True)
-        except FileNotFoundError:
-            pass  # First time, create new file
-        
-        df.to_csv(self.csv_path, index=False)
+        # Append to CSV (buffered, flushed periodically)
+        self.sink.write(result_data, job_id=job_id)
     
     def generate_summary(self):
         """Generate summary of all tests"""
         print("\n📊 === DAY 3 SUMMARY ===")
         
         total_tests = len(self.results)
-        categories = {}
-        
-        for result in self.results:
-            category = result['test_category']
-            categories[category] = categories.get(category, 0) + 1
+        run_results = pd.DataFrame(self.results, columns=['test_category'])
+        categories = run_results['test_category'].value_counts(sort=False).to_dict()
         
         print(f"✅ Total tests completed: {total_tests}")
         print(f"📋 Test categories:")
         for category, count in categories.items():
             print(f"   • {category}: {count} tests")
         
+        self.usage.print_summary()
+        self.sink.flush()
+        # Whole log (all runs), read in chunks: latency percentiles, length, tok/s, distinct-n
+        analytics = summarize_log('day03', self.csv_path)
+        print_report(analytics, title="DAY 3 LOG ANALYTICS")
+        if self.skipped_jobs:
+            print(f"⏭️  Skipped {self.skipped_jobs} unchanged tests (already in {self.csv_path})")
+        local_providers = [
+            provider for provider in self.providers.providers().values()
+            if isinstance(provider, HFLocalProvider)
+        ]
+        if local_providers:
+            get_registry().print_stats()
+        for provider in local_providers:
+            provider.cache.print_stats()
+            if provider.prefix_cache is not None:
+                provider.prefix_cache.print_stats()
         print(f"💾 Results saved to: {self.csv_path}")
         print(f"📁 CSV file size: {os.path.getsize(self.csv_path)} bytes")
         
         return {
             'total_tests': total_tests,
             'categories': categories,
+            'analytics': analytics,
             'csv_path': self.csv_path
         }
     
@@ -0,0 +1,130 @@
+"""
+Experiment Runner - rinnakkaiset prompt-kokeet
+Ajaa deklaratiivisen listan tai generaattorin (prompt, params, category)
+-jobeja prosessipoolissa. Torchin säikeet jaetaan workereiden kesken,
+tulokset palautetaan jobien järjestyksessä.
+"""
+
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+_worker_cache = None
+
+
+def default_workers() -> int:
+    """Workereiden määrä: EXPERIMENT_WORKERS tai puolet ytimistä (max 4)"""
+    configured = os.getenv('EXPERIMENT_WORKERS')
+    if configured:
+        return max(1, int(configured))
+    return max(1, min(4, (os.cpu_count() or 2) // 2))
+
+
+def _init_worker(threads_per_worker: int):
+    """Rajaa workerin torch-säikeet, ettei ytimiä ylivarata"""
+    os.environ['OMP_NUM_THREADS'] = str(threads_per_worker)
+    os.environ['MKL_NUM_THREADS'] = str(threads_per_worker)
+    import torch
+    torch.set_num_threads(threads_per_worker)
+    torch.set_num_interop_threads(1)
+
+
+def run_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Ajaa yhden jobin (workerissa); malli ladataan kerran per prosessi"""
+    global _worker_cache
+    from generation_cache import DEFAULT_SEED, GenerationCache, cached_pipeline_call
+    from model_registry import get_pipeline
+    from providers import get_provider, split_model
+    from tokenizer_service import get_tokenizer_service
+
+    if _worker_cache is None:
+        _worker_cache = GenerationCache()
+
+    start = time.perf_counter()
+    try:
+        if split_model(job['model'])[0] != 'hf':
+            # openai:/fake: -mallit providerin kautta (ei paikallista pipelinea)
+            result = get_provider(job['model']).generate(dict(job['params'], prompt=job['prompt']))
+            text, error = result['text'], None
+            prompt_tokens, completion_tokens = result.get('prompt_tokens', 0), result.get('completion_tokens', 0)
+        else:
+            generator = get_pipeline("text-generation", model=job['model'])
+            params = dict(job['params'])
+            seed = DEFAULT_SEED + params.pop('sample', 0)  # spec: samples > 1
+            result = cached_pipeline_call(_worker_cache, generator, job['prompt'], seed=seed, **params)
+            text, error = result[0]['generated_text'], None
+            # Pipelinen teksti sisältää promptin: completion = koko - prompt
+            tokens = get_tokenizer_service(job['model'])
+            prompt_tokens, total_tokens = tokens.count_batch([job['prompt'], text])
+            completion_tokens = max(0, total_tokens - prompt_tokens)
+    except Exception as e:
+        text, error = None, str(e)
+        prompt_tokens = completion_tokens = 0
+
+    return {
+        'job': job,
+        'result': text,
+        'error': error,
+        'latency_s': time.perf_counter() - start,
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+        'worker_pid': os.getpid(),
+    }
+
+
+def iter_experiments(jobs: Iterable[Dict[str, Any]], workers: Optional[int] = None,
+                     max_in_flight: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """Ajaa jobit rinnakkain ja tuottaa tulokset jobien järjestyksessä.
+
+    Job on dict: {'prompt', 'model', 'params', 'category', 'notes'}. jobs voi
+    olla generaattori; korkeintaan max_in_flight jobia on kerrallaan muistissa.
+    """
+    workers = workers or default_workers()
+    max_in_flight = max_in_flight or workers * 2
+    threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+    print(f"⚙️  {workers} workeria × {threads_per_worker} torch-säiettä")
+
+    count = 0
+    start = time.perf_counter()
+
+    def report(outcome):
+        job = outcome['job']
+        if outcome['error']:
+            print(f"❌ Test {count} [{job['category']}] failed: {outcome['error']}")
+        else:
+            print(f"✅ Test {count} [{job['category']}] {outcome['latency_s']:.2f}s")
+        return outcome
+
+    if workers == 1:
+        for job in jobs:
+            count += 1
+            yield report(run_job(job))
+    else:
+        # spawn: ei forkata prosessia jossa torchin säikeet ovat jo käynnissä
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(threads_per_worker,)
+        ) as executor:
+            pending = deque()
+            for job in jobs:
+                pending.append(executor.submit(run_job, job))
+                if len(pending) >= max_in_flight:
+                    count += 1
+                    yield report(pending.popleft().result())
+            while pending:
+                count += 1
+                yield report(pending.popleft().result())
+
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed if elapsed > 0 else 0.0
+    print(f"📈 {count} promptia {elapsed:.1f}s → {rate:.2f} promptia/s")
+
+
+def run_experiments(jobs: Iterable[Dict[str, Any]], workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Kuten iter_experiments, mutta palauttaa kaikki tulokset listana"""
+    return list(iter_experiments(jobs, workers))
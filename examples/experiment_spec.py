@@ -0,0 +1,187 @@
+"""
+Experiment Spec - deklaratiiviset koetiedostot (YAML/JSON)
+Kuvaa promptit, parametrigridit, mallit ja kategoriat tiedostossa.
+iter_jobs() laajentaa gridit laiskasti generaattorina ja poistaa
+identtiset jobit ennen kuin ne päätyvät mallille.
+
+Esimerkki:
+    defaults:
+      model: gpt2
+    experiments:
+      - category: temperature_variation
+        params: {max_new_tokens: 100}
+        grid: {temperature: [0.1, 0.5, 1.0]}      # karteesinen tulo
+        variants:                                  # tai lista parametrisettejä
+          - {name: Conservative, temperature: 0.2, top_p: 0.8}
+        samples: 3                                 # näytettä per prompt+parametrit (oletus 1)
+        template: "System: {system}\\nUser: {user}"  # valinnainen
+        notes: "Temperature {temperature} test #{index}"
+        prompts:
+          - "The future of artificial intelligence will"
+          - {system: ..., user: ..., task: ...}     # kentät templateen / notesiin
+"""
+
+import hashlib
+import itertools
+import json
+import os
+from typing import Any, Dict, Iterable, Iterator, Optional, Set
+
+SPEC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "experiments")
+
+
+def spec_path(name: str) -> str:
+    """Polku examples/experiments/<name>.yaml"""
+    return os.path.join(SPEC_DIR, f"{name}.yaml")
+
+
+def load_spec(path: str) -> Dict[str, Any]:
+    """Lataa spec-tiedoston (.yaml/.yml tai .json)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("YAML-specit vaativat PyYAML:n (pip install pyyaml)")
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def job_id(job: Dict[str, Any]) -> str:
+    """Vakaa tunniste: hash(malli, prompt, parametrit)"""
+    payload = json.dumps(
+        {'model': job['model'], 'prompt': job['prompt'], 'params': job['params']},
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def checkpoint_id(job: Dict[str, Any], **settings) -> str:
+    """Checkpoint-avain: job_id + ajon asetukset jotka eivät ole specissä (esim. inference_mode, backend).
+
+    Asetukset vaikuttavat vain paikallisiin (Hugging Face) malleihin; API- ja
+    fake-malleille palautetaan job_id sellaisenaan.
+    """
+    from providers import split_model
+
+    if not settings or split_model(job['model'])[0] != 'hf':
+        return job['job_id']
+    payload = json.dumps({'job_id': job['job_id'], **settings}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def prompt_length(prompt: str, model: str = "gpt2") -> int:
+    """Promptin pituus tokeneina max_length_over_prompt -laskentaan (pipelinen max_length on tokeneita)"""
+    from providers import split_model
+    from tokenizer_service import count_tokens
+
+    prefix, name = split_model(model)
+    # API-malleille ei ladata tokenizeria: gpt2 (BPE) on riittävä arvio
+    return count_tokens(prompt, name if prefix == 'hf' else 'gpt2')
+
+
+def _grid(grid: Optional[Dict[str, Iterable]]) -> Iterator[Dict[str, Any]]:
+    """Karteesinen tulo grid-parametreista (laiskasti)"""
+    if not grid:
+        yield {}
+        return
+    keys = list(grid)
+    for values in itertools.product(*(grid[key] for key in keys)):
+        yield dict(zip(keys, values))
+
+
+def expand_experiment(experiment: Dict[str, Any], defaults: Dict[str, Any],
+                      samples: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """Laajentaa yhden kokeen jobeiksi: prompt × malli × variantti × grid × näyte
+
+    samples ohittaa kokeen oman samples-arvon (None = spec-tiedoston arvo).
+    """
+    models = experiment.get('models') or [experiment.get('model', defaults.get('model', 'gpt2'))]
+    variants = experiment.get('variants') or [{}]
+    template = experiment.get('template')
+    index = experiment.get('index_start', 1)
+    samples = samples or experiment.get('samples', 1)
+
+    for entry in experiment.get('prompts', []):
+        fields = dict(entry) if isinstance(entry, dict) else {'prompt': entry}
+        prompt = fields.pop('prompt', None)
+        if template:
+            prompt = template.format(**fields)
+
+        for model in models:
+            for variant in variants:
+                variant = dict(variant)
+                variant_name = variant.pop('name', None)
+
+                for grid_values, sample in itertools.product(_grid(experiment.get('grid')), range(samples)):
+                    params = dict(defaults.get('params', {}))
+                    params.update(experiment.get('params', {}))
+                    params.update(variant)
+                    params.update(grid_values)
+                    if samples > 1:
+                        # Näyteindeksi erottaa seedin; peräkkäiset näytteet ajetaan yhdellä kutsulla
+                        params['sample'] = sample
+
+                    over_prompt = params.pop('max_length_over_prompt', None)
+                    if over_prompt is not None:
+                        params['max_length'] = prompt_length(prompt, model) + over_prompt
+
+                    job = {
+                        'category': experiment['category'],
+                        'model': model,
+                        'notes': experiment.get('notes', ''),
+                    }
+                    job.update(fields)
+                    if variant_name:
+                        job['variant_name'] = variant_name
+                    job['prompt'] = prompt
+                    job['params'] = params
+
+                    context = {**fields, **params, 'index': index, 'model': model,
+                               'variant_name': variant_name, 'sample': sample}
+                    job['notes'] = job['notes'].format(**context)
+                    job['job_id'] = job_id(job)
+
+                    yield job
+                    index += 1
+
+
+def iter_jobs(spec, categories: Optional[Iterable[str]] = None,
+              samples: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """Generaattori spec-tiedoston (tai dictin) jobeista, duplikaatit poistettuna.
+
+    categories rajaa kokeet kategorian mukaan (spec-tiedoston järjestyksessä).
+    samples ohittaa kokeiden samples-arvon (esim. opt-in self-BLEU -sweep).
+    """
+    if isinstance(spec, str):
+        spec = load_spec(spec)
+    defaults = spec.get('defaults', {})
+    wanted = set(categories) if categories is not None else None
+
+    seen = set()
+    duplicates = 0
+    for experiment in spec.get('experiments', []):
+        if wanted is not None and experiment['category'] not in wanted:
+            continue
+        for job in expand_experiment(experiment, defaults, samples):
+            if job['job_id'] in seen:
+                duplicates += 1
+                continue
+            seen.add(job['job_id'])
+            yield job
+
+    if duplicates:
+        print(f"♻️  Ohitettiin {duplicates} identtistä jobia")
+
+
+def skip_completed(jobs: Iterable[Dict[str, Any]], completed: Set[str]) -> Iterator[Dict[str, Any]]:
+    """Ohittaa jobit joiden job_id on jo kirjattu valmiiksi (muuttunut job saa uuden id:n)"""
+    skipped = 0
+    for job in jobs:
+        if job['job_id'] in completed:
+            skipped += 1
+            continue
+        yield job
+
+    if skipped:
+        print(f"⏭️  Ohitettiin {skipped} jo valmista jobia (checkpoint)")
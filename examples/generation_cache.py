@@ -0,0 +1,137 @@
+"""
+Generation Cache - deterministinen generointivälimuisti
+Tallentaa generoinnit levylle (SQLite) avaimella
+hash(malli, revisio, tarkkuus, prompt, sampling-parametrit, seed). Osuma palauttaa
+tallennetun tuloksen koskematta malliin.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Optional
+
+DEFAULT_CACHE_PATH = "cache/generations.sqlite"
+DEFAULT_SEED = 42
+
+
+def model_identity(model):
+    """Palauttaa (malli-id, revisio, tarkkuus) transformers-mallista"""
+    config = getattr(model, 'config', None)
+    name = getattr(config, 'name_or_path', None) or type(model).__name__
+    revision = getattr(config, '_commit_hash', None)
+    return name, revision, model_precision(model)
+
+
+def model_precision(model) -> str:
+    """'int8' dynaamisesti kvantisoidulle mallille, 'onnx' ONNX Runtimelle, muuten painojen dtype"""
+    if type(model).__name__.startswith('ORTModel'):
+        return 'onnx'
+    modules = getattr(model, 'modules', None)
+    if modules is None:
+        return 'unknown'
+    if any(hasattr(module, '_packed_params') for module in modules()):
+        return 'int8'
+    return str(getattr(model, 'dtype', 'unknown')).replace('torch.', '')
+
+
+class GenerationCache:
+    """SQLite-pohjainen välimuisti, LRU-poisto kun max_entries ylittyy"""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: Optional[int] = None):
+        if max_entries is None:
+            max_entries = int(os.getenv('GENERATION_CACHE_MAX_ENTRIES', '50000'))
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._db = sqlite3.connect(path, timeout=30)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS generations ("
+            " key TEXT PRIMARY KEY, output TEXT NOT NULL,"
+            " created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON generations(last_used)")
+        self._db.commit()
+        self._count = self._db.execute("SELECT COUNT(*) FROM generations").fetchone()[0]
+
+    def make_key(self, model, prompt: str, params: Dict[str, Any]) -> str:
+        """Avain: malli + revisio + tarkkuus + prompt + kaikki sampling-parametrit (ml. seed)"""
+        name, revision, precision = model_identity(model)
+        payload = json.dumps(
+            {'model': name, 'revision': revision, 'precision': precision, 'prompt': prompt, 'params': params},
+            sort_keys=True, ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str):
+        """Palauttaa tallennetun tuloksen tai None"""
+        row = self._db.execute("SELECT output FROM generations WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._db.execute("UPDATE generations SET last_used = ? WHERE key = ?", (time.time(), key))
+        self._db.commit()
+        return json.loads(row[0])
+
+    def put(self, key: str, output):
+        """Tallentaa tuloksen ja poistaa vanhimmat jos koko ylittyy"""
+        now = time.time()
+        cursor = self._db.execute(
+            "INSERT OR IGNORE INTO generations (key, output, created, last_used) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(output, ensure_ascii=False), now, now)
+        )
+        self._count += cursor.rowcount
+
+        overflow = self._count - self.max_entries
+        if overflow > 0:
+            self._db.execute(
+                "DELETE FROM generations WHERE key IN "
+                "(SELECT key FROM generations ORDER BY last_used LIMIT ?)",
+                (overflow,)
+            )
+            self._count -= overflow
+            self.evictions += overflow
+        self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': self._count,
+            'evictions': self.evictions,
+        }
+
+    def print_stats(self):
+        stats = self.stats()
+        print(f"🗄️  Generointivälimuisti: {stats['hits']}/{stats['hits'] + stats['misses']} osumaa "
+              f"({stats['hit_rate']:.0%}), {stats['entries']} tallennettua, "
+              f"{stats['evictions']} poistettua")
+
+    def close(self):
+        self._db.close()
+
+
+def cached_pipeline_call(cache: GenerationCache, generator, prompt: str, seed: int = DEFAULT_SEED, **kwargs):
+    """Kutsuu transformers-pipelinea välimuistin kautta (seed tekee tuloksesta toistettavan)"""
+    key = cache.make_key(generator.model, prompt, dict(kwargs, seed=seed))
+    result = cache.get(key)
+    if result is not None:
+        return result
+
+    from transformers import set_seed
+    set_seed(seed)
+    result = generator(prompt, **kwargs)
+    cache.put(key, result)
+    return result
@@ -0,0 +1,442 @@
+"""
+Hugging Face - Batched Generation
+Kokoaa samoilla sampling-parametreilla ajettavat promptit yhteen
+generate()-kutsuun (left padding + attention mask).
+
+Liian pitkät promptit lyhennetään token-tasolla ennen generointia:
+  left            - pudotetaan alusta, loppu (kysymys) säilyy
+  sliding_window  - säilytetään alku (ohje) + viimeisin ikkuna
+Vain uudet tokenit dekoodataan, joten promptia ei tarvitse leikata tekstistä.
+
+Saman promptin useat näytteet samoilla parametreilla ajetaan yhdellä
+generate()-kutsulla (num_return_sequences). Valinnainen PrefixCache
+käyttää saman promptin past_key_values-arvot uudelleen eri
+sampling-parametreilla (temperature sweep, A/B-variantit). Eri promptit,
+joilla on yhteinen alku (CoT-prompt alkaa suoran kysymyksen tekstillä,
+few-shot-esimerkit), ryhmitellään samaan batchiin ja prefiksi lasketaan
+kerran; täyte sijoitetaan prefiksin ja loppuosan väliin.
+"""
+
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+import torch
+from transformers import LogitsProcessor, LogitsProcessorList, TextIteratorStreamer
+
+from prefix_cache import common_prefix_length
+from providers import stream_metrics
+from tokenizer_service import TokenizerService
+
+
+TRUNCATION_STRATEGIES = ('left', 'sliding_window')
+
+# Sama top-k kuin generate()-kutsun oletus (GenerationConfig.top_k), myös seedatulla polulla
+DEFAULT_TOP_K = 50
+
+
+def sampling_key(request: Dict[str, Any]):
+    """Palauttaa pyynnön sampling-parametrit ryhmittelyavaimena"""
+    return (
+        request.get('temperature', 0.7),
+        request.get('top_p'),
+        request.get('max_new_tokens', 150),
+        request.get('seed') is not None,
+    )
+
+
+class SeededSampler(LogitsProcessor):
+    """Rivikohtainen seedattu sampling (Gumbel-max) greedy-haun sisällä.
+
+    Jokaisella rivillä on oma torch.Generator, joten rivin tulos riippuu
+    vain sen promptista, parametreista ja seedistä - ei batchin muista
+    riveistä. Tämä tekee välimuistiosumista toistettavia. Suodatus tehdään
+    samassa järjestyksessä kuin do_sample-polulla: temperature, top-k, top-p.
+    """
+
+    def __init__(self, temperature, top_p, seeds, top_k=DEFAULT_TOP_K):
+        self.temperature = temperature
+        self.top_p = top_p
+        self.top_k = top_k
+        self.generators = [torch.Generator().manual_seed(seed) for seed in seeds]
+
+    def __call__(self, input_ids, scores):
+        scores = scores.float() / max(self.temperature, 1e-5)
+
+        if self.top_k and self.top_k < scores.shape[-1]:
+            kth = torch.topk(scores, self.top_k, dim=-1).values[..., -1:]
+            scores = scores.masked_fill(scores < kth, float('-inf'))
+
+        if self.top_p is not None and self.top_p < 1.0:
+            sorted_scores, sorted_indices = torch.sort(scores, descending=True)
+            probs = sorted_scores.softmax(dim=-1)
+            # Poista tokenit joiden kumulatiivinen todennäköisyys ylittää top_p (paras jää aina)
+            remove_sorted = probs.cumsum(dim=-1) - probs > self.top_p
+            remove = remove_sorted.scatter(1, sorted_indices, remove_sorted)
+            scores = scores.masked_fill(remove, float('-inf'))
+
+        uniform = torch.stack([
+            torch.rand(scores.shape[-1], generator=generator) for generator in self.generators
+        ]).clamp_(1e-10, 1.0 - 1e-10)
+        # argmax(logits + Gumbel) ~ sample(softmax(logits))
+        return scores - torch.log(-torch.log(uniform))
+
+
+class TimedStreamer(TextIteratorStreamer):
+    """TextIteratorStreamer joka kirjaa jokaisen uuden tokenin saapumisajan"""
+
+    def __init__(self, tokenizer, timeout=None):
+        super().__init__(tokenizer, skip_prompt=True, skip_special_tokens=True, timeout=timeout)
+        self.token_times = []
+
+    def put(self, value):
+        # Ensimmäinen put on prompt (skip_prompt), sen jälkeen yksi token per askel
+        if not self.next_tokens_are_prompt:
+            self.token_times.extend([time.perf_counter()] * value.numel())
+        super().put(value)
+
+
+class BatchGenerator:
+    """Ajaa generointipyynnöt erissä yhdellä mallilla"""
+
+    def __init__(self, model, tokenizer, batch_size=8, max_input_length=500,
+                 cache=None, seed: Optional[int] = None, truncation: str = 'left',
+                 keep_head_tokens: int = 64, prefix_cache=None, tokens: Optional[TokenizerService] = None):
+        if truncation not in TRUNCATION_STRATEGIES:
+            raise ValueError(f"Tuntematon truncation '{truncation}' (valitse {TRUNCATION_STRATEGIES})")
+        self.model = model
+        self.tokenizer = tokenizer
+        # Toistuvat promptit (sweepit, A/B, truncation_info) enkoodataan vain kerran
+        self.tokens = tokens or TokenizerService(tokenizer)
+        self.batch_size = batch_size
+        self.max_input_length = max_input_length
+        self.truncation = truncation
+        self.keep_head_tokens = keep_head_tokens
+        self.prefix_cache = prefix_cache
+        self.cache = cache
+        self.seed = seed
+        self.batch_stats = []
+
+        # Rekisterin tokenizer on jaettu: sitä ei muokata, täyte tehdään itse (_encode)
+        self.pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+
+    def generate(self, requests: List[Dict[str, Any]], info: Optional[List[Dict[str, Any]]] = None) -> List[str]:
+        """Generoi vastaukset pyyntölistalle ja palauttaa ne samassa järjestyksessä.
+
+        Jokainen pyyntö on dict: {'prompt', 'temperature', 'top_p', 'max_new_tokens',
+        'seed', 'sample', 'truncation'}. Samoilla parametreilla olevat pyynnöt ajetaan
+        samassa batchissa ja saman promptin näytteet (eri 'sample') yhdellä kutsulla;
+        välimuistista löytyvät palautetaan ajamatta mallia. Jos info on annettu,
+        siihen lisätään jokaisen pyynnön truncation_info().
+        """
+        requests = [self._with_default_seed(request) for request in requests]
+        responses = [None] * len(requests)
+        if info is not None:
+            info.extend(self.truncation_info(request) for request in requests)
+        cache_keys = {}
+
+        groups = {}
+        for index, request in enumerate(requests):
+            if self.cache is not None:
+                cache_keys[index] = self.cache.make_key(self.model, request['prompt'], self._cache_params(request))
+                cached = self.cache.get(cache_keys[index])
+                if cached is not None:
+                    responses[index] = cached
+                    continue
+            groups.setdefault(sampling_key(request), []).append(index)
+
+        for (temperature, top_p, max_new_tokens, _), indices in groups.items():
+            for chunk, samples in self._chunks(requests, indices):
+                failed = False
+                try:
+                    texts = self._generate_batch(
+                        [requests[i] for i in chunk[::samples]],
+                        temperature=temperature,
+                        top_p=top_p,
+                        max_new_tokens=max_new_tokens,
+                        seeds=[requests[i].get('seed') for i in chunk],
+                        samples=samples
+                    )
+                except Exception as e:
+                    texts = [f"Error: {str(e)}"] * len(chunk)
+                    failed = True  # Virheitä ei tallenneta välimuistiin
+
+                for index, text in zip(chunk, texts):
+                    responses[index] = text
+                    if index in cache_keys and not failed:
+                        self.cache.put(cache_keys[index], text)
+
+        return responses
+
+    def _chunks(self, requests, indices):
+        """Jakaa ryhmän ajoiksi: (indeksit, näytteitä per prompt).
+
+        Saman promptin usea näyte -> oma ajo jossa prompt kerran ja
+        num_return_sequences näytettä; yksittäiset promptit batcheina.
+        """
+        by_prompt = {}
+        for index in indices:
+            by_prompt.setdefault(requests[index]['prompt'], []).append(index)
+
+        singles = []
+        for same_prompt in by_prompt.values():
+            if len(same_prompt) == 1:
+                singles.extend(same_prompt)
+                continue
+            per_call = max(1, self.batch_size)
+            for start in range(0, len(same_prompt), per_call):
+                part = same_prompt[start:start + per_call]
+                if len(part) == 1:
+                    singles.extend(part)
+                else:
+                    yield part, len(part)
+
+        if self.prefix_cache is not None and len(singles) > 1:
+            groups, singles = self._prefix_groups(requests, singles)
+            for group in groups:
+                yield group, 1
+
+        for start in range(0, len(singles), self.batch_size):
+            yield singles[start:start + self.batch_size], 1
+
+    def _prefix_groups(self, requests, indices):
+        """Eri promptit, joilla on yhteinen token-prefiksi: palauttaa (ryhmät, loput).
+
+        Promptit järjestetään tokenien mukaan, jolloin saman alun jakavat ovat
+        vierekkäin. Ryhmä katkeaa kun yhteinen prefiksi lyhenisi alle
+        min_prefix_tokens:n tai batch täyttyy; yksin jäävät menevät tavallisiin batcheihin.
+        """
+        encoded = dict(zip(indices, self.tokens.encode_batch([requests[i]['prompt'] for i in indices])))
+        groups, rest = [], []
+        group, prefix = [], ()
+        for index in sorted(indices, key=lambda i: encoded[i]):
+            ids = encoded[index]
+            shared = common_prefix_length(prefix, ids)
+            if group and shared >= self.prefix_cache.min_prefix_tokens and len(group) < self.batch_size:
+                group.append(index)
+                prefix = prefix[:shared]
+                continue
+            if len(group) > 1:
+                groups.append(group)
+            else:
+                rest.extend(group)
+            group, prefix = [index], ids
+        if len(group) > 1:
+            groups.append(group)
+        else:
+            rest.extend(group)
+        return groups, rest
+
+    def _with_default_seed(self, request):
+        """Oletus-seed + näyteindeksi: saman promptin näytteet eroavat toisistaan"""
+        seed = request.get('seed', self.seed)
+        if seed is None:
+            return request
+        return dict(request, seed=seed + request.get('sample', 0))
+
+    def _cache_params(self, request):
+        """Parametrit jotka vaikuttavat tulokseen (välimuistiavaimeen)"""
+        return {
+            'temperature': request.get('temperature', 0.7),
+            'top_p': request.get('top_p'),
+            'top_k': DEFAULT_TOP_K,
+            'max_new_tokens': request.get('max_new_tokens', 150),
+            'seed': request.get('seed'),
+            'sample': request.get('sample', 0),
+            'max_input_length': self.max_input_length,
+            'truncation': self._strategy(request),
+        }
+
+    def _strategy(self, request):
+        strategy = request.get('truncation') or self.truncation
+        if strategy not in TRUNCATION_STRATEGIES:
+            raise ValueError(f"Tuntematon truncation '{strategy}' (valitse {TRUNCATION_STRATEGIES})")
+        return strategy
+
+    def _truncate(self, ids: List[int], strategy: str):
+        """Lyhentää token-listan max_input_lengthiin; palauttaa (ids, poistetut tokenit)"""
+        overflow = len(ids) - self.max_input_length
+        if overflow <= 0:
+            return ids, 0
+        if strategy == 'sliding_window':
+            # Ohje / ensimmäinen esimerkki alusta + viimeisimmät tokenit kysymyksen ympäriltä
+            head = min(self.keep_head_tokens, self.max_input_length // 2)
+            return ids[:head] + ids[head + overflow:], overflow
+        return ids[overflow:], overflow
+
+    def truncation_info(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Promptin token-määrä ja montako tokenia lyhennys poistaa"""
+        strategy = self._strategy(request)
+        ids = self.tokens.encode(request['prompt'])
+        _, dropped = self._truncate(ids, strategy)
+        return {
+            'prompt_tokens': len(ids),
+            'truncated_tokens': dropped,
+            'truncation': strategy if dropped else '',
+        }
+
+    def _encode(self, requests: List[Dict[str, Any]]):
+        """Tokenisoi ja lyhentää promptit -> (tensorit, rivit, yhteisen prefiksin pituus).
+
+        Kun prefix-välimuisti on käytössä ja riveillä on vähintään min_prefix_tokens
+        yhteistä alkua, täyte sijoitetaan prefiksin ja loppuosan väliin
+        (attention_mask 0), jolloin prefiksin KV lasketaan kerran koko batchille.
+        Muuten tavallinen left padding (decoder-only: generointi jatkaa suoraan
+        promptista) ja prefiksin pituus 0.
+        """
+        rows = []
+        encoded = self.tokens.encode_batch([request['prompt'] for request in requests])
+        for request, ids in zip(requests, encoded):
+            strategy = self._strategy(request)
+            ids, dropped = self._truncate(ids, strategy)
+            if dropped:
+                print(f"   ✂️  Prompt lyhennettiin: {dropped} tokenia pois ({strategy})")
+            rows.append(list(ids))
+
+        prefix_length = 0
+        if self.prefix_cache is not None:
+            # Jokaiselle riville jää vähintään yksi token generate()-kutsulle
+            prefix_length = min(len(row) for row in rows) - 1
+            for row in rows[1:]:
+                prefix_length = min(prefix_length, common_prefix_length(rows[0], row))
+            if prefix_length < self.prefix_cache.min_prefix_tokens:
+                prefix_length = 0
+
+        width = max(len(row) for row in rows)
+        input_ids, attention_mask = [], []
+        for row in rows:
+            padding = width - len(row)
+            input_ids.append(row[:prefix_length] + [self.pad_token_id] * padding + row[prefix_length:])
+            attention_mask.append([1] * prefix_length + [0] * padding + [1] * (len(row) - prefix_length))
+        inputs = {'input_ids': torch.tensor(input_ids), 'attention_mask': torch.tensor(attention_mask)}
+        return inputs, rows, prefix_length
+
+    def _prefix_kwargs(self, rows, prefix_length, batch_size) -> Dict[str, Any]:
+        """past_key_values batchin yhteiselle prefiksille (lasketaan kerran, monistetaan riveille)"""
+        if not prefix_length:
+            return {}
+        # prefill laskee ids[:-1]: mukaan yksi token prefiksin jälkeen
+        past = self.prefix_cache.prefill(self.model, rows[0][:prefix_length + 1])
+        if past is None:
+            return {}
+        if batch_size > 1:
+            past.batch_repeat_interleave(batch_size)
+        return {'past_key_values': past}
+
+    def _generate_kwargs(self, temperature, top_p, max_new_tokens, seeds):
+        """generate()-parametrit: seedattu sampling tai tavallinen do_sample"""
+        generate_kwargs = {
+            'max_new_tokens': max_new_tokens,
+            'pad_token_id': self.pad_token_id,
+        }
+        if seeds[0] is not None:
+            # Sampling tehdään SeededSamplerissa, generate valitsee argmaxin
+            generate_kwargs['do_sample'] = False
+            generate_kwargs['logits_processor'] = LogitsProcessorList([
+                SeededSampler(temperature, top_p, seeds)
+            ])
+        else:
+            generate_kwargs['do_sample'] = True
+            generate_kwargs['temperature'] = temperature
+            generate_kwargs['top_k'] = DEFAULT_TOP_K
+            if top_p is not None:
+                generate_kwargs['top_p'] = top_p
+        return generate_kwargs
+
+    def stream(self, request: Dict[str, Any], metrics: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        """Generoi yhden pyynnön ja tuottaa tekstiä sitä mukaa kun tokeneita syntyy.
+
+        Latenssimittarit (ttft_s, inter_token_ms, tokens_per_s) ja truncation_info()
+        päivitetään metrics-dictiin kun generointi on valmis. Välimuistia ei lueta, koska
+        mittaus vaatii mallin ajon; valmis tulos tallennetaan välimuistiin.
+        """
+        request = self._with_default_seed(request)
+        inputs, rows, prefix_length = self._encode([request])
+        generate_kwargs = self._generate_kwargs(
+            request.get('temperature', 0.7),
+            request.get('top_p'),
+            request.get('max_new_tokens', 150),
+            [request.get('seed')]
+        )
+        generate_kwargs.update(self._prefix_kwargs(rows, prefix_length, 1))
+        streamer = TimedStreamer(self.tokenizer)
+
+        errors = []
+
+        def run():
+            try:
+                with torch.no_grad():
+                    self.model.generate(
+                        inputs['input_ids'],
+                        attention_mask=inputs['attention_mask'],
+                        streamer=streamer,
+                        **generate_kwargs
+                    )
+            except Exception as e:
+                errors.append(e)
+                streamer.end()  # Vapauttaa lukijan
+
+        start = time.perf_counter()
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+
+        pieces = []
+        for piece in streamer:
+            pieces.append(piece)
+            yield piece
+        thread.join()
+        if errors:
+            raise errors[0]
+
+        if metrics is not None:
+            metrics.update(stream_metrics(start, streamer.token_times))
+            metrics.update(self.truncation_info(request))
+        if self.cache is not None:
+            key = self.cache.make_key(self.model, request['prompt'], self._cache_params(request))
+            self.cache.put(key, ''.join(pieces).strip())
+
+    def _generate_batch(self, requests, temperature, top_p, max_new_tokens, seeds, samples=1):
+        """Generoi yhden batchin ja raportoi sen läpäisykyvyn.
+
+        samples > 1: jokaisesta promptista samples näytettä (tulokset
+        järjestyksessä prompt kerrallaan), prompt tokenisoidaan kerran.
+        """
+        inputs, rows, prefix_length = self._encode(requests)
+
+        generate_kwargs = self._generate_kwargs(temperature, top_p, max_new_tokens, seeds)
+        if samples > 1 and seeds[0] is None:
+            generate_kwargs['num_return_sequences'] = samples
+        else:
+            if samples > 1:
+                # Seedattu haku on generate():lle greedy, joka ei salli num_return_sequences > 1:
+                # rivit monistetaan itse, jotta jokainen näyte saa oman generatorinsa
+                inputs = {key: value.repeat_interleave(samples, dim=0) for key, value in inputs.items()}
+            generate_kwargs.update(self._prefix_kwargs(rows, prefix_length, inputs['input_ids'].shape[0]))
+
+        start = time.perf_counter()
+        with torch.no_grad():
+            outputs = self.model.generate(
+                inputs['input_ids'],
+                attention_mask=inputs['attention_mask'],
+                **generate_kwargs
+            )
+        elapsed = time.perf_counter() - start
+
+        # Left padding: kaikki promptit päättyvät samaan sarakkeeseen, dekoodataan vain uudet tokenit
+        new_tokens = outputs[:, inputs['input_ids'].shape[1]:]
+        generated = int((new_tokens != self.pad_token_id).sum())
+
+        tokens_per_second = generated / elapsed if elapsed > 0 else 0.0
+        self.batch_stats.append({
+            'batch_size': len(requests) * samples,
+            'generated_tokens': generated,
+            'elapsed_s': elapsed,
+            'tokens_per_second': tokens_per_second
+        })
+        print(f"   ⚡ Batch {len(requests)} promptia × {samples} näytettä: {generated} tokenia "
+              f"{elapsed:.1f}s ({tokens_per_second:.1f} tok/s)")
+
+        return [
+            text.strip()
+            for text in self.tokenizer.batch_decode(new_tokens, skip_special_tokens=True)
+        ]
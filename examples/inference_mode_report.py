@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Inference Mode Report - fp32 vs bf16 vs int8
+Ajaa olemassa olevat promptisetit (experiments/*.yaml) jokaisella
+tarkkuudella ja vertaa tuloksia fp32:een:
+  - latenssi ja tokenit/s (greedy, sama max_new_tokens)
+  - promptin perplexity (tarkkuuden mittari)
+  - seuraavan tokenin top-1 -osuma fp32:n kanssa
+  - greedy-tuloksen yhteinen alku fp32:n kanssa
+Tulokset: logs/inference_mode_report.csv
+
+Käyttö: python inference_mode_report.py [fp32 bf16 int8]
+"""
+
+import csv
+import math
+import os
+import sys
+import time
+from typing import Dict, List
+
+import torch
+
+from experiment_spec import iter_jobs, spec_path
+from model_registry import INFERENCE_MODES, get_registry
+
+REPORT_PATH = "logs/inference_mode_report.csv"
+PROMPT_SETS = ('prompt_experiments', 'day03_advanced', 'lightweight_tests')
+MODEL_NAME = "gpt2"
+MAX_NEW_TOKENS = 30
+MAX_INPUT_LENGTH = 500
+
+
+def load_prompt_sets() -> Dict[str, List[str]]:
+    """Uniikit promptit per spec-tiedosto (manuaaliset esimerkit ohitetaan)"""
+    prompt_sets = {}
+    for name in PROMPT_SETS:
+        prompts = []
+        for job in iter_jobs(spec_path(name)):
+            if 'result' not in job and job['prompt'] not in prompts:
+                prompts.append(job['prompt'])
+        prompt_sets[name] = prompts
+    return prompt_sets
+
+
+def run_prompt(model, tokenizer, prompt: str) -> Dict:
+    """Yksi prompt: perplexity + top-1 ennusteet + ajastettu greedy-generointi"""
+    ids = tokenizer(prompt, return_tensors="pt")['input_ids'][:, -MAX_INPUT_LENGTH:]
+
+    with torch.no_grad():
+        logits = model(ids).logits[0].float()
+        start = time.perf_counter()
+        output = model.generate(
+            ids,
+            attention_mask=torch.ones_like(ids),
+            max_new_tokens=MAX_NEW_TOKENS,
+            do_sample=False,
+            pad_token_id=tokenizer.eos_token_id
+        )
+        latency = time.perf_counter() - start
+
+    targets = ids[0, 1:]
+    nll = -logits[:-1].log_softmax(dim=-1).gather(1, targets.unsqueeze(1)).mean().item() if len(targets) else 0.0
+    return {
+        'top1': logits.argmax(dim=-1).tolist(),
+        'generated': output[0, ids.shape[1]:].tolist(),
+        'nll': nll,
+        'latency_s': latency,
+    }
+
+
+def common_prefix_ratio(a: List[int], b: List[int]) -> float:
+    """Kuinka suuri osa b:stä toistuu identtisenä a:n alussa"""
+    if not b:
+        return 1.0
+    same = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        same += 1
+    return same / len(b)
+
+
+def summarize(mode, prompt_set, runs, baseline, size_bytes) -> Dict:
+    """Koosterivi: latenssi, tokenit/s, perplexity ja osumat fp32:een"""
+    latency = sum(run['latency_s'] for run in runs)
+    tokens = sum(len(run['generated']) for run in runs)
+    base_latency = sum(run['latency_s'] for run in baseline)
+
+    top1_same = sum(
+        sum(x == y for x, y in zip(run['top1'], base['top1']))
+        for run, base in zip(runs, baseline)
+    )
+    top1_total = sum(len(base['top1']) for base in baseline)
+
+    return {
+        'mode': mode,
+        'prompt_set': prompt_set,
+        'prompts': len(runs),
+        'model_mb': round(size_bytes / 1024 / 1024, 1),
+        'mean_latency_s': round(latency / len(runs), 4),
+        'tokens_per_s': round(tokens / latency, 2) if latency > 0 else 0.0,
+        'speedup_vs_fp32': round(base_latency / latency, 2) if latency > 0 else 0.0,
+        'perplexity': round(math.exp(sum(run['nll'] for run in runs) / len(runs)), 3),
+        'top1_agreement': round(top1_same / top1_total, 4) if top1_total else 1.0,
+        'greedy_prefix_match': round(
+            sum(common_prefix_ratio(run['generated'], base['generated']) for run, base in zip(runs, baseline))
+            / len(runs), 4
+        ),
+    }
+
+
+def compare_modes(modes: List[str]) -> List[Dict]:
+    """Ajaa kaikki promptisetit jokaisella tilalla; fp32 on aina vertailukohta"""
+    prompt_sets = load_prompt_sets()
+    modes = ['fp32'] + [mode for mode in modes if mode != 'fp32']
+    registry = get_registry()
+
+    results = {}
+    sizes = {}
+    for mode in modes:
+        print(f"\n⚙️  === {mode.upper()} ===")
+        entry = registry.get(MODEL_NAME, mode=mode)
+        model, tokenizer = entry['model'], entry['tokenizer']
+        sizes[mode] = entry['size_bytes']
+        run_prompt(model, tokenizer, "Warm up")  # Ensimmäinen kutsu alustaa kernelit
+
+        for prompt_set, prompts in prompt_sets.items():
+            results[mode, prompt_set] = [run_prompt(model, tokenizer, prompt) for prompt in prompts]
+            print(f"   ✅ {prompt_set}: {len(prompts)} promptia")
+
+    return [
+        summarize(mode, prompt_set, results[mode, prompt_set], results['fp32', prompt_set], sizes[mode])
+        for mode in modes
+        for prompt_set in prompt_sets
+    ]
+
+
+def write_report(rows: List[Dict], path: str = REPORT_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def print_report(rows: List[Dict]):
+    print("\n📊 === INFERENCE MODE VERTAILU (vs fp32) ===")
+    print(f"{'mode':<6} {'promptisetti':<20} {'MB':>7} {'lat s':>8} {'tok/s':>7} "
+          f"{'nopeus':>7} {'ppl':>8} {'top-1':>7} {'greedy':>7}")
+    for row in rows:
+        print(f"{row['mode']:<6} {row['prompt_set']:<20} {row['model_mb']:>7} "
+              f"{row['mean_latency_s']:>8.3f} {row['tokens_per_s']:>7.1f} "
+              f"{row['speedup_vs_fp32']:>6.2f}x {row['perplexity']:>8.2f} "
+              f"{row['top1_agreement']:>7.1%} {row['greedy_prefix_match']:>7.1%}")
+
+
+def main():
+    modes = sys.argv[1:] or list(INFERENCE_MODES)
+    unknown = [mode for mode in modes if mode not in INFERENCE_MODES]
+    if unknown:
+        print(f"❌ Tuntematon tila: {', '.join(unknown)} (valitse {', '.join(INFERENCE_MODES)})")
+        return
+
+    rows = compare_modes(modes)
+    print_report(rows)
+    write_report(rows)
+    print(f"\n💾 Raportti tallennettu: {REPORT_PATH}")
+
+
+if __name__ == "__main__":
+    main()
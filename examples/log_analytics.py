@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Log Analytics - vektoroidut yhteenvedot koelokeista
+Lokit luetaan paloina (pd.read_csv chunksize tai Parquet-batchit), joten
+miljoonien rivien loki ei ole koskaan kokonaan muistissa. Jokaisesta
+palasta lasketaan ryhmäkohtaiset summat ja latenssihistogrammit, jotka
+yhdistetään lopuksi: latenssipersentiilit, vastauksen pituus, tokenit/s
+ja distinct-n -monimuotoisuus per kategoria, malli ja parametrit.
+
+Käyttö:
+    python log_analytics.py                        # day03 + prompt_log
+    python log_analytics.py --log day03 --chunksize 50000
+    python log_analytics.py --log day03 --path parquet/day03_advanced_prompts
+"""
+
+import argparse
+import os
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from result_sink import DAY03_LOG_PATH, DAY03_LOG_SCHEMA, PROMPT_LOG_PATH, PROMPT_LOG_SCHEMA
+
+DEFAULT_CHUNK_ROWS = int(os.getenv('ANALYTICS_CHUNK_ROWS', '100000'))
+
+# Latenssihistogrammi: log-välit 1 ms - 1000 s (persentiilit ~1 % tarkkuudella)
+LATENCY_BINS = np.geomspace(1e-3, 1e3, 1201)
+PERCENTILES = (50, 90, 99)
+
+# Ryhmittelyt: nimi -> avainsarakkeet
+GROUPINGS = {
+    'category': ['category'],
+    'model': ['model'],
+    'params': ['model', 'temperature', 'top_p', 'max_tokens'],
+}
+KEY_COLUMNS = ('category', 'model', 'temperature', 'top_p', 'max_tokens')
+
+# Rivikohtaiset mittarit, joista raportoidaan keskiarvo (summa + määrä per pala)
+MEAN_COLUMNS = ('output_chars', 'output_words', 'tokens_per_s', 'distinct_1', 'distinct_2',
+                'repetition_rate', 'self_bleu', 'perplexity')
+
+# int-sarakkeissa voi olla tyhjiä -> float
+_PANDAS_TYPES = {str: 'object', float: 'float64', int: 'float64'}
+
+
+def iter_log_chunks(path: str, schema: Dict[str, type], columns: Optional[List[str]] = None,
+                    chunksize: Optional[int] = None) -> Iterator[pd.DataFrame]:
+    """Lokin rivit DataFrame-paloina (CSV-tiedosto tai Parquet-hakemisto)"""
+    chunksize = chunksize or DEFAULT_CHUNK_ROWS
+    columns = list(columns or schema)
+
+    if os.path.isdir(path):
+        # ResultSinkin Parquet-kopio: luetaan vain tarvitut sarakkeet batch kerrallaan
+        import pyarrow.dataset as ds
+        dataset = ds.dataset(path, format='parquet')
+        present = [name for name in columns if name in dataset.schema.names]
+        for batch in dataset.to_batches(columns=present, batch_size=chunksize):
+            yield batch.to_pandas()
+        return
+
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return
+    dtypes = {name: _PANDAS_TYPES[kind] for name, kind in schema.items() if name in columns}
+    # Vanhan skeeman tiedostosta puuttuvat sarakkeet ohitetaan (normalisointi lisää ne NaN:ina)
+    with pd.read_csv(path, usecols=lambda name: name in columns, dtype=dtypes,
+                     chunksize=chunksize) as reader:
+        yield from reader
+
+
+def count_log_rows(path: str, chunksize: Optional[int] = None) -> int:
+    """Lokin rivimäärä (lainausmerkeissä olevat rivinvaihdot eivät lisää rivejä)"""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return 0
+    with pd.read_csv(path, usecols=[0], dtype=object, chunksize=chunksize or DEFAULT_CHUNK_ROWS) as reader:
+        return sum(len(chunk) for chunk in reader)
+
+
+def ngram_hashes(texts: pd.Series, n: int) -> pd.Series:
+    """Vastausten sana-n-grammit hasheina (index = tekstin index, tekstin järjestyksessä)"""
+    tokens = texts.str.lower().str.split().explode().dropna()
+    if tokens.empty:
+        return pd.Series([], dtype='uint64')
+
+    codes = pd.Series(pd.factorize(tokens)[0], index=tokens.index)
+    by_row = codes.groupby(level=0)
+    grams = pd.DataFrame({k: by_row.shift(-k) if k else codes for k in range(n)}).dropna()
+    return pd.Series(pd.util.hash_pandas_object(grams, index=False).to_numpy(), index=grams.index)
+
+
+def distinct_n(texts: pd.Series, n: int) -> pd.Series:
+    """Per vastaus: uniikit n-grammit / kaikki n-grammit (NaN jos alle n sanaa)"""
+    by_text = ngram_hashes(texts, n).groupby(level=0)
+    return (by_text.nunique() / by_text.size()).reindex(texts.index)
+
+
+def _labels(column: pd.Series) -> pd.Series:
+    """Ryhmittelyavain merkkijonoksi: 0.70 -> '0.7', 150.0 -> '150', puuttuva -> '-'"""
+    if pd.api.types.is_numeric_dtype(column):
+        column = column.round(4).astype('string').str.replace(r'\.0$', '', regex=True)
+    return column.astype('string').fillna('-')
+
+
+def _day03_frame(chunk: pd.DataFrame) -> pd.DataFrame:
+    """day03_advanced_prompts.csv -> yhteinen muoto"""
+    chunk = chunk.reindex(columns=list(DAY03_LOG_SCHEMA))
+    for name, kind in DAY03_LOG_SCHEMA.items():
+        if kind is not str:
+            chunk[name] = pd.to_numeric(chunk[name], errors='coerce')
+    frame = pd.DataFrame({
+        'category': chunk['test_category'],
+        'model': chunk['model'],
+        'text': chunk['response'],
+        'latency_s': chunk['latency_s'],
+        'tokens_per_s': chunk['tokens_per_s'],
+        'cost_usd': chunk['cost_usd'],
+        'repetition_rate': chunk['repetition_rate'],
+        'self_bleu': chunk['self_bleu'],
+        'perplexity': chunk['perplexity'],
+        'temperature': chunk['temperature'],
+        'top_p': chunk['top_p'],
+        'max_tokens': chunk['max_tokens'],
+    })
+    # Streamatuilla riveillä mitattu tok/s, muuten completion-tokenit / latenssi
+    derived = chunk['completion_tokens'] / chunk['latency_s'].where(chunk['latency_s'] > 0)
+    frame['tokens_per_s'] = frame['tokens_per_s'].fillna(derived)
+    return frame
+
+
+def _param(params: pd.Series, name: str, pattern: str = r"([-0-9.eE]+)") -> pd.Series:
+    """Yksi arvo prompt_login params-sarakkeesta (str(dict)) regexillä koko palalle kerralla"""
+    return params.str.extract(rf"'{name}':\s*{pattern}", expand=False)
+
+
+def _prompt_log_frame(chunk: pd.DataFrame) -> pd.DataFrame:
+    """prompt_log.csv -> yhteinen muoto (parametrit params-sarakkeesta)"""
+    chunk = chunk.reindex(columns=list(PROMPT_LOG_SCHEMA))
+    params = chunk['params'].fillna('')
+    category = _param(params, 'category', r"'([^']*)'").fillna(_param(params, 'technique', r"'([^']*)'"))
+    max_tokens = _param(params, 'max_new_tokens').fillna(_param(params, 'max_length'))
+
+    # Pipelinen tulos alkaa promptilla: pituus ja monimuotoisuus vain generoidusta osasta
+    prompts = chunk['prompt'].fillna('').astype('string')
+    generated = chunk['result'].astype('string')
+    lengths = prompts.str.len()
+    # str.slice ottaa yhden pituuden: vektoroitu vertailu kerran per promptin pituus
+    for length, rows in lengths.groupby(lengths).groups.items():
+        results = generated[rows]
+        starts = (results.str.slice(0, length) == prompts[rows]).fillna(False).astype(bool)
+        generated[rows[starts.to_numpy()]] = results[starts].str.slice(length)
+
+    return pd.DataFrame({
+        'category': category,
+        'model': chunk['model'],
+        'text': generated,
+        'latency_s': np.nan,  # Day 2 -loki ei mittaa latenssia
+        'tokens_per_s': np.nan,
+        'cost_usd': np.nan,
+        'repetition_rate': np.nan,  # Laatumittarit vain Day 3 -sweepeille
+        'self_bleu': np.nan,
+        'perplexity': np.nan,
+        'temperature': pd.to_numeric(_param(params, 'temperature'), errors='coerce'),
+        'top_p': pd.to_numeric(_param(params, 'top_p'), errors='coerce'),
+        'max_tokens': pd.to_numeric(max_tokens, errors='coerce'),
+    }, index=chunk.index)
+
+
+LOG_SOURCES = {
+    'day03': {'path': DAY03_LOG_PATH, 'schema': DAY03_LOG_SCHEMA, 'normalize': _day03_frame},
+    'prompt': {'path': PROMPT_LOG_PATH, 'schema': PROMPT_LOG_SCHEMA, 'normalize': _prompt_log_frame},
+}
+
+
+def add_text_metrics(frame: pd.DataFrame) -> pd.DataFrame:
+    """Virheet, vastauksen pituus ja distinct-1/2 (virherivit eivät mukana tekstimittareissa)"""
+    text = frame['text'].astype('string')
+    frame['error'] = text.fillna('').str.startswith('Error:').astype(bool)
+    text = text.where(~frame['error'])
+    frame['output_chars'] = text.str.len().astype(float)
+    frame['output_words'] = text.str.count(r'\S+').astype(float)
+    frame['distinct_1'] = distinct_n(text, 1)
+    frame['distinct_2'] = distinct_n(text, 2)
+    for column in KEY_COLUMNS:
+        frame[column] = _labels(frame[column])
+    return frame
+
+
+class LogAggregator:
+    """Yhdistää palakohtaiset ryhmäsummat ja latenssihistogrammit yhdeksi taulukoksi"""
+
+    def __init__(self, keys: List[str]):
+        self.keys = keys
+        self.sums = None       # index = avaimet, sarakkeet = summat ja määrät
+        self.histogram = None  # index = avaimet, sarakkeet = LATENCY_BINS-indeksit
+
+    def add(self, frame: pd.DataFrame):
+        spec = {'rows': ('error', 'size'), 'errors': ('error', 'sum'), 'cost_usd': ('cost_usd', 'sum')}
+        for column in MEAN_COLUMNS:
+            spec[f'{column}_sum'] = (column, 'sum')
+            spec[f'{column}_n'] = (column, 'count')
+        sums = frame.groupby(self.keys).agg(**spec)
+        self.sums = sums if self.sums is None else self.sums.add(sums, fill_value=0)
+
+        latency = frame['latency_s'].to_numpy(dtype=float)
+        valid = ~np.isnan(latency)
+        if valid.any():
+            bins = np.minimum(np.searchsorted(LATENCY_BINS, latency[valid]), len(LATENCY_BINS) - 1)
+            counts = frame.loc[valid, self.keys].assign(bin=bins).groupby(self.keys + ['bin']).size()
+            histogram = counts.unstack('bin', fill_value=0)
+            self.histogram = histogram if self.histogram is None else self.histogram.add(histogram, fill_value=0)
+
+    def percentiles(self) -> pd.DataFrame:
+        """Latenssipersentiilit histogrammista (välin yläraja)"""
+        columns = [f'latency_p{q}_s' for q in PERCENTILES]
+        if self.histogram is None:
+            return pd.DataFrame(columns=columns, dtype=float)
+        histogram = self.histogram.sort_index(axis=1)
+        cumulative = histogram.to_numpy().cumsum(axis=1)
+        total = cumulative[:, -1:]
+        edges = LATENCY_BINS[histogram.columns.to_numpy(dtype=int)]
+        values = {
+            column: edges[(cumulative >= total * q / 100).argmax(axis=1)]
+            for column, q in zip(columns, PERCENTILES)
+        }
+        return pd.DataFrame(values, index=histogram.index)
+
+    def result(self) -> pd.DataFrame:
+        if self.sums is None:
+            return pd.DataFrame()
+        sums = self.sums
+        table = pd.DataFrame({
+            'rows': sums['rows'].astype(int),
+            'errors': sums['errors'].astype(int),
+        }, index=sums.index)
+        percentiles = self.percentiles()
+        for column in percentiles:
+            table[column] = percentiles[column]  # NaN ryhmille ilman latenssia
+        for column in MEAN_COLUMNS:
+            table[f'avg_{column}'] = sums[f'{column}_sum'] / sums[f'{column}_n'].replace(0, np.nan)
+        table['cost_usd'] = sums['cost_usd']
+        return table
+
+
+def summarize_log(kind: str = 'day03', path: Optional[str] = None,
+                  groupings: Optional[Dict[str, List[str]]] = None,
+                  chunksize: Optional[int] = None) -> Dict[str, pd.DataFrame]:
+    """Lukee lokin paloina ja palauttaa taulukon per ryhmittely (category, model, params)"""
+    source = LOG_SOURCES[kind]
+    aggregators = {name: LogAggregator(keys) for name, keys in (groupings or GROUPINGS).items()}
+
+    for chunk in iter_log_chunks(path or source['path'], source['schema'], chunksize=chunksize):
+        frame = add_text_metrics(source['normalize'](chunk.reset_index(drop=True)))
+        for aggregator in aggregators.values():
+            aggregator.add(frame)
+
+    return {name: aggregator.result() for name, aggregator in aggregators.items()}
+
+
+def print_report(tables: Dict[str, pd.DataFrame], title: str = "LOKIANALYYSI"):
+    """Tulostaa summarize_login taulukot"""
+    print(f"\n📈 === {title} ===")
+    if all(table.empty for table in tables.values()):
+        print("   (ei rivejä)")
+        return
+    with pd.option_context('display.width', 160, 'display.max_columns', None):
+        for name, table in tables.items():
+            print(f"\n🔎 {name}:")
+            # Tyhjät sarakkeet (esim. latenssi Day 2 -lokissa) jätetään pois
+            print(table.dropna(axis=1, how='all').to_string(float_format=lambda value: f"{value:.3g}"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Koelokien yhteenvedot (pandas, paloittain)")
+    parser.add_argument('--log', choices=sorted(LOG_SOURCES), action='append',
+                        help="analysoitava loki (oletus: kaikki)")
+    parser.add_argument('--path', help="lokin polku (CSV tai Parquet-hakemisto)")
+    parser.add_argument('--chunksize', type=int, default=None, help="rivejä per pala")
+    args = parser.parse_args()
+
+    for kind in args.log or sorted(LOG_SOURCES):
+        source_path = args.path or LOG_SOURCES[kind]['path']
+        if not os.path.isdir(source_path):
+            print(f"📂 {kind}: {source_path} ({count_log_rows(source_path)} riviä)")
+        print_report(summarize_log(kind, args.path, chunksize=args.chunksize), title=kind.upper())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Mock OpenAI Server - paikallinen /v1/chat/completions offline-tarkistuksiin
+Palauttaa deterministisen vastauksen ja usage-kentät (tai SSE-streamin),
+voi simuloida viivettä sekä 429/503-virheitä (Retry-After). Laskee
+samanaikaisten pyyntöjen huipun, jotta rinnakkaisuusraja voidaan todentaa.
+
+Käyttö:
+    python mock_openai_server.py --port 8099 --fail-rate 0.2 --latency 0.2
+    OPENAI_BASE_URL=http://127.0.0.1:8099/v1 python playground.py
+
+    python mock_openai_server.py --check   # ajaa openai_async-tarkistuksen offline
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockState:
+    """Palvelimen laskurit (jaettu säikeiden kesken)"""
+
+    def __init__(self, fail_rate=0.0, latency=0.0, seed=0):
+        self.fail_rate = fail_rate
+        self.latency = latency
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak_active = 0
+        self.requests = 0
+        self.failures = 0
+        self.connections = set()
+
+    def enter(self, client):
+        with self.lock:
+            self.active += 1
+            self.requests += 1
+            self.peak_active = max(self.peak_active, self.active)
+            self.connections.add(client)
+            return self.random.random() < self.fail_rate
+
+    def leave(self):
+        with self.lock:
+            self.active -= 1
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive: asiakkaan yhteyspooli käyttää yhteyksiä uudelleen
+    state: MockState = None
+
+    def log_message(self, format, *args):
+        pass  # Ei lokia jokaisesta pyynnöstä
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, model, words, usage=None):
+        """Server-sent events: yksi chunk per sana, usage-chunk (include_usage) ja lopuksi [DONE]"""
+        events = []
+        for i, word in enumerate(words):
+            chunk = {
+                'id': f"chatcmpl-mock-{self.state.requests}",
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'delta': {'content': word if i == 0 else ' ' + word},
+                             'finish_reason': None}],
+            }
+            events.append(f"data: {json.dumps(chunk)}\n\n")
+        if usage is not None:
+            chunk = {
+                'id': f"chatcmpl-mock-{self.state.requests}",
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [],
+                'usage': usage,
+            }
+            events.append(f"data: {json.dumps(chunk)}\n\n")
+        events.append("data: [DONE]\n\n")
+        body = ''.join(events).encode('utf-8')
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+
+        if not self.path.endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': f'Unknown path {self.path}'}})
+            return
+
+        fail = self.state.enter(self.client_address)
+        try:
+            time.sleep(self.state.latency)
+            if fail:
+                with self.state.lock:
+                    self.state.failures += 1
+                status = self.state.random.choice([429, 503])
+                self._send_json(status, {'error': {'message': 'Simulated failure', 'type': 'mock'}},
+                                headers={'Retry-After': '0.1'} if status == 429 else None)
+                return
+
+            prompt = ' '.join(message.get('content', '') for message in request.get('messages', []))
+            max_tokens = int(request.get('max_tokens') or 16)
+            words = f"Mock reply to: {prompt}".split()[:max_tokens]
+            prompt_tokens = len(prompt.split())
+            usage = {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': len(words),
+                'total_tokens': prompt_tokens + len(words),
+            }
+            if request.get('stream'):
+                include_usage = (request.get('stream_options') or {}).get('include_usage')
+                self._send_stream(request.get('model', 'mock'), words, usage if include_usage else None)
+                return
+            self._send_json(200, {
+                'id': f"chatcmpl-mock-{self.state.requests}",
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': request.get('model', 'mock'),
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': ' '.join(words)},
+                    'finish_reason': 'stop',
+                }],
+                'usage': usage,
+            })
+        finally:
+            self.state.leave()
+
+
+def serve_in_thread(port=0, fail_rate=0.0, latency=0.0):
+    """Käynnistää palvelimen taustasäikeeseen; palauttaa (server, state, base_url)"""
+    state = MockState(fail_rate=fail_rate, latency=latency)
+    handler = type('BoundMockHandler', (MockHandler,), {'state': state})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    return server, state, base_url
+
+
+def run_check(requests=40, concurrency=4, fail_rate=0.2, latency=0.1):
+    """Offline-tarkistus: rinnakkaisuusraja, uudelleenyritykset ja yhteyksien uudelleenkäyttö"""
+    from openai_async import run_completions
+
+    server, state, base_url = serve_in_thread(fail_rate=fail_rate, latency=latency)
+    print(f"🧪 Mock-palvelin {base_url} (virheitä {fail_rate:.0%}, viive {latency}s)")
+
+    start = time.perf_counter()
+    results = run_completions(
+        [f"Test prompt number {i}" for i in range(requests)],
+        api_key="mock-key",
+        base_url=base_url,
+        max_concurrency=concurrency,
+        requests_per_minute=6000,
+        max_tokens=8
+    )
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    errors = [r for r in results if isinstance(r, Exception)]
+    print(f"⏱️  {requests} pyyntöä {elapsed:.2f}s (sarjassa ~{requests * latency:.1f}s + uusinnat)")
+    print(f"📈 Palvelin: {state.requests} HTTP-pyyntöä, {state.failures} simuloitua virhettä, "
+          f"huippu {state.peak_active} samanaikaista, {len(state.connections)} TCP-yhteyttä")
+
+    ok = not errors and state.peak_active <= concurrency
+    print("✅ Tarkistus läpi" if ok else f"❌ Tarkistus epäonnistui ({len(errors)} virhettä)")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Paikallinen mock OpenAI -palvelin")
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--check', action='store_true', help="aja openai_async-tarkistus ja lopeta")
+    args = parser.parse_args()
+
+    if args.check:
+        raise SystemExit(0 if run_check(fail_rate=args.fail_rate or 0.2, latency=args.latency or 0.1) else 1)
+
+    server, state, base_url = serve_in_thread(args.port, args.fail_rate, args.latency)
+    print(f"🚀 Mock OpenAI käynnissä: OPENAI_BASE_URL={base_url} (Ctrl+C lopettaa)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(f"\n👋 {state.requests} pyyntöä, huippu {state.peak_active} samanaikaista")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+Model Registry - Hugging Face mallit kerran per prosessi
+Lataa mallit laiskasti avaimella (malli, task, inference mode, device),
+jakaa painot kaikille kutsujille ja poistaa vanhimmat (LRU) muistibudjetin
+ylittyessä.
+
+Inference mode (INFERENCE_MODE tai mode=...):
+  fp32  - oletus
+  bf16  - bfloat16-painot (puolet muistista)
+  int8  - dynaaminen int8-kvantisointi (torch), Linear-kerrokset CPU:lla
+
+Backend (GENERATION_BACKEND tai backend=...):
+  torch - eager PyTorch (oletus)
+  onnx  - ONNX Runtime (optimum), past-key-value -graafi viedään kerran
+          hakemistoon ONNX_CACHE_DIR ja ladataan sieltä seuraavilla kerroilla
+"""
+
+import gc
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+INFERENCE_MODES = {
+    'fp32': 'float32',
+    'bf16': 'bfloat16',
+    'int8': 'float32',  # ladataan fp32:na ja kvantisoidaan
+}
+
+
+BACKENDS = ('torch', 'onnx')
+ONNX_CACHE_DIR = os.getenv('ONNX_CACHE_DIR', 'cache/onnx')
+
+
+def default_backend() -> str:
+    """GENERATION_BACKEND ympäristöstä (oletus torch)"""
+    return os.getenv('GENERATION_BACKEND', 'torch')
+
+
+def default_inference_mode() -> str:
+    """INFERENCE_MODE ympäristöstä (oletus fp32)"""
+    return os.getenv('INFERENCE_MODE', 'fp32')
+
+
+def resident_size_bytes(model) -> int:
+    """Mallin parametrien, bufferien ja kvantisoitujen painojen koko muistissa"""
+    tensors = list(model.parameters()) + list(model.buffers())
+    for module in model.modules():
+        # Dynaamisesti kvantisoidun Linearin painot eivät ole parametreja
+        if hasattr(module, '_packed_params') and callable(getattr(module, 'weight', None)):
+            tensors.append(module.weight())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+def onnx_size_bytes(path: str) -> int:
+    """Viedyn ONNX-graafin (ja painotiedostojen) koko levyllä"""
+    return sum(
+        os.path.getsize(os.path.join(path, name))
+        for name in os.listdir(path)
+        if name.endswith(('.onnx', '.onnx_data'))
+    )
+
+
+def load_onnx_causal_lm(model_name: str, cache_dir: str = ONNX_CACHE_DIR):
+    """ORTModelForCausalLM past-key-value -tuella; vienti tehdään vain kerran levylle"""
+    try:
+        from optimum.onnxruntime import ORTModelForCausalLM
+    except ImportError:
+        raise ImportError("ONNX-backend vaatii optimumin (pip install optimum[onnxruntime])")
+    from transformers import AutoTokenizer
+
+    path = os.path.join(cache_dir, model_name.replace('/', '--'))
+    if os.path.exists(os.path.join(path, 'config.json')):
+        model = ORTModelForCausalLM.from_pretrained(path, use_cache=True)
+        tokenizer = AutoTokenizer.from_pretrained(path)
+    else:
+        print(f"🔄 Viedään {model_name} ONNX-muotoon ({path})...")
+        model = ORTModelForCausalLM.from_pretrained(model_name, export=True, use_cache=True)
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model.save_pretrained(path)
+        tokenizer.save_pretrained(path)
+    return model, tokenizer, path
+
+
+def conv1d_to_linear(model):
+    """GPT-2:n Conv1D-kerrokset nn.Lineariksi (quantize_dynamic tuntee vain Linearin)"""
+    import torch
+    from transformers.pytorch_utils import Conv1D
+
+    for parent in list(model.modules()):
+        for name, child in list(parent.named_children()):
+            if isinstance(child, Conv1D):
+                in_features, out_features = child.weight.shape
+                linear = torch.nn.Linear(in_features, out_features, dtype=child.weight.dtype)
+                with torch.no_grad():
+                    linear.weight.copy_(child.weight.t())  # Conv1D: x @ W, Linear: x @ W.T
+                    linear.bias.copy_(child.bias)
+                setattr(parent, name, linear)
+    return model
+
+
+def quantize_int8(model):
+    """Dynaaminen int8-kvantisointi paikallaan: painot int8, aktivaatiot kvantisoidaan lennossa"""
+    import torch
+
+    conv1d_to_linear(model)
+    return torch.ao.quantization.quantize_dynamic(
+        model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+    )
+
+
+class ModelRegistry:
+    """Prosessin laajuinen malli-/pipeline-välimuisti"""
+
+    def __init__(self, memory_budget_mb: Optional[float] = None):
+        if memory_budget_mb is None:
+            memory_budget_mb = float(os.getenv('MODEL_MEMORY_BUDGET_MB', '4096'))
+        self.memory_budget_bytes = int(memory_budget_mb * 1024 * 1024)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, model_name: str, task: str = "text-generation",
+            mode: Optional[str] = None, device: str = "cpu",
+            backend: Optional[str] = None) -> Dict[str, Any]:
+        """Palauttaa ladatun mallin tiedot (lataa ensimmäisellä kutsulla)"""
+        mode = mode or default_inference_mode()
+        backend = backend or default_backend()
+        if mode not in INFERENCE_MODES:
+            raise ValueError(f"Tuntematon inference mode '{mode}' (valitse {', '.join(INFERENCE_MODES)})")
+        if backend not in BACKENDS:
+            raise ValueError(f"Tuntematon backend '{backend}' (valitse {', '.join(BACKENDS)})")
+        key = (model_name, task, mode, device, backend)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                load = self._load_onnx if backend == 'onnx' else self._load
+                entry = load(model_name, task, mode, device)
+                self._entries[key] = entry
+                self._evict()
+            else:
+                entry['hits'] += 1
+            self._entries.move_to_end(key)
+            return entry
+
+    def pipeline(self, task: str = "text-generation", model: str = "gpt2", **kwargs):
+        """Sama kutsutapa kuin transformers.pipeline(task, model=...)"""
+        return self.get(model, task, **kwargs)['pipeline']
+
+    def model_and_tokenizer(self, model_name: str, **kwargs):
+        """Palauttaa (model, tokenizer) -parin jaetuilla painoilla"""
+        entry = self.get(model_name, **kwargs)
+        return entry['model'], entry['tokenizer']
+
+    def _load(self, model_name, task, mode, device):
+        from transformers import pipeline
+        import torch
+
+        dtype = INFERENCE_MODES[mode]
+        print(f"📦 Ladataan {model_name} ({task}, {mode}, {device})...")
+        start = time.perf_counter()
+        pipe = pipeline(task, model=model_name, torch_dtype=getattr(torch, dtype), device=device)
+        if mode == 'int8':
+            if device != 'cpu':
+                raise ValueError("int8 (dynaaminen kvantisointi) toimii vain CPU:lla")
+            quantize_int8(pipe.model)
+        pipe.model.eval()
+        load_time = time.perf_counter() - start
+
+        size = resident_size_bytes(pipe.model)
+        print(f"✅ {model_name} ladattu {load_time:.1f}s ({size / 1024 / 1024:.0f} MB)")
+
+        return {
+            'model_name': model_name,
+            'task': task,
+            'mode': mode,
+            'dtype': dtype,
+            'device': device,
+            'backend': 'torch',
+            'pipeline': pipe,
+            'model': pipe.model,
+            'tokenizer': pipe.tokenizer,
+            'load_time_s': load_time,
+            'size_bytes': size,
+            'hits': 0,
+        }
+
+    def _load_onnx(self, model_name, task, mode, device):
+        from transformers import pipeline
+
+        if task != "text-generation" or mode != 'fp32' or device != 'cpu':
+            raise ValueError("ONNX-backend tukee vain text-generation / fp32 / cpu -yhdistelmää")
+
+        print(f"📦 Ladataan {model_name} ({task}, onnxruntime)...")
+        start = time.perf_counter()
+        model, tokenizer, path = load_onnx_causal_lm(model_name)
+        pipe = pipeline(task, model=model, tokenizer=tokenizer)
+        load_time = time.perf_counter() - start
+
+        size = onnx_size_bytes(path)
+        print(f"✅ {model_name} (ONNX) ladattu {load_time:.1f}s ({size / 1024 / 1024:.0f} MB)")
+
+        return {
+            'model_name': model_name,
+            'task': task,
+            'mode': mode,
+            'dtype': INFERENCE_MODES[mode],
+            'device': device,
+            'backend': 'onnx',
+            'pipeline': pipe,
+            'model': model,
+            'tokenizer': tokenizer,
+            'load_time_s': load_time,
+            'size_bytes': size,
+            'hits': 0,
+        }
+
+    def _evict(self):
+        """Poistaa vanhimmat mallit kunnes budjetti riittää (uusin jää aina)"""
+        evicted = False
+        while len(self._entries) > 1 and self.total_bytes() > self.memory_budget_bytes:
+            key, entry = self._entries.popitem(last=False)
+            print(f"♻️  Poistetaan muistista {key[0]} ({entry['size_bytes'] / 1024 / 1024:.0f} MB)")
+            evicted = True
+        if evicted:
+            gc.collect()
+
+    def total_bytes(self) -> int:
+        return sum(entry['size_bytes'] for entry in self._entries.values())
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Latausaika, koko ja osumat per ladattu malli"""
+        return [
+            {k: v for k, v in entry.items() if k not in ('pipeline', 'model', 'tokenizer')}
+            for entry in self._entries.values()
+        ]
+
+    def print_stats(self):
+        print("\n📦 === LADATUT MALLIT ===")
+        for entry in self.stats():
+            print(f"   • {entry['model_name']} [{entry['task']}, {entry['mode']}, {entry['device']}, {entry['backend']}]: "
+                  f"{entry['load_time_s']:.1f}s, {entry['size_bytes'] / 1024 / 1024:.0f} MB, "
+                  f"{entry['hits']} uudelleenkäyttöä")
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ModelRegistry:
+    """Prosessin jaettu rekisteri"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry()
+        return _registry
+
+
+def get_pipeline(task: str = "text-generation", model: str = "gpt2", **kwargs):
+    """Korvaa transformers.pipeline -kutsun: sama malli ladataan vain kerran"""
+    return get_registry().pipeline(task, model=model, **kwargs)
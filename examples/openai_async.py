@@ -0,0 +1,234 @@
+"""
+Async OpenAI - rinnakkaiset OpenAI-kutsut hallitusti
+AsyncOpenAI-asiakas jaetulla HTTP-yhteyspoolilla, semaforilla
+rajattu rinnakkaisuus, token bucket -rajoitus (pyynnöt ja tokenit
+minuutissa) sekä jitteröidyt uudelleenyritykset 429/5xx-virheille.
+
+OPENAI_BASE_URL ohjaa kutsut esim. paikalliseen mock-palvelimeen
+(mock_openai_server.py), jolloin kaiken voi tarkistaa offline.
+"""
+
+import asyncio
+import os
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Token bucket: rate_per_minute yksikköä minuutissa, purske korkeintaan capacity"""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1.0) -> float:
+        """Odottaa kunnes amount yksikköä on saatavilla; palauttaa odotusajan"""
+        amount = min(amount, self.capacity)  # Yli kapasiteetin menevä pyyntö ei saa jumittaa
+        waited = 0.0
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) / self.rate
+                waited += delay
+                await asyncio.sleep(delay)
+
+    def refund(self, amount: float):
+        """Palauttaa arvion ja toteuman erotuksen (arvio oli liian suuri)"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+def retry_delay(attempt: int, base: float = 0.5, cap: float = 20.0, retry_after: Optional[float] = None) -> float:
+    """Full jitter -backoff; palvelimen Retry-After on alaraja"""
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+def _status_and_retry_after(error):
+    """HTTP-status ja Retry-After openai-kirjaston poikkeuksesta (None jos ei HTTP-virhe)"""
+    response = getattr(error, 'response', None)
+    status = getattr(error, 'status_code', None) or getattr(response, 'status_code', None)
+    retry_after = None
+    if response is not None:
+        try:
+            retry_after = float(response.headers.get('retry-after'))
+        except (TypeError, ValueError):
+            retry_after = None
+    return status, retry_after
+
+
+class AsyncOpenAIProvider:
+    """Chat completions AsyncOpenAI:lla: yhteyspooli + semafori + rate limit + retry"""
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 model: str = "gpt-3.5-turbo", max_concurrency: Optional[int] = None,
+                 requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None,
+                 max_retries: int = 5, timeout: float = 60.0):
+        try:
+            import httpx
+            from openai import AsyncOpenAI
+        except ImportError:
+            raise ImportError("Async OpenAI vaatii openai>=1.0 ja httpx (pip install openai)")
+
+        max_concurrency = max_concurrency or int(os.getenv('OPENAI_MAX_CONCURRENCY', '8'))
+        requests_per_minute = requests_per_minute or float(os.getenv('OPENAI_RPM', '500'))
+        tokens_per_minute = tokens_per_minute or float(os.getenv('OPENAI_TPM', '60000'))
+
+        self.model = model
+        self.max_retries = max_retries
+        # Yksi pooli kaikille kutsuille: keep-alive -yhteydet käytetään uudelleen
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+            timeout=timeout
+        )
+        self.client = AsyncOpenAI(
+            api_key=api_key or os.getenv('OPENAI_API_KEY'),
+            base_url=base_url or os.getenv('OPENAI_BASE_URL') or None,
+            http_client=self.http_client,
+            max_retries=0  # Uudelleenyritykset hoidetaan täällä (jitter + rate limit)
+        )
+        self.semaphore = asyncio.BoundedSemaphore(max_concurrency)
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.stats = {'requests': 0, 'retries': 0, 'failures': 0, 'rate_limited_s': 0.0,
+                      'prompt_tokens': 0, 'completion_tokens': 0}
+
+    @staticmethod
+    def estimate_tokens(prompt: str, max_tokens: int) -> int:
+        """Karkea arvio rate limitiin (~4 merkkiä per token + vastauksen yläraja)"""
+        return len(prompt) // 4 + 1 + max_tokens
+
+    async def _create(self, prompt: str, max_tokens: int, temperature: float,
+                      model: Optional[str], estimate: int, **params):
+        """Rate limit + uudelleenyritykset yhden create-kutsun ympärillä; palauttaa (vastaus, yritykset)"""
+        from openai import APIConnectionError, APIStatusError, APITimeoutError
+
+        for attempt in range(self.max_retries + 1):
+            waited = await self.request_bucket.acquire(1)
+            waited += await self.token_bucket.acquire(estimate)
+            self.stats['rate_limited_s'] += waited
+
+            try:
+                response = await self.client.chat.completions.create(
+                    model=model or self.model,
+                    messages=[{"role": "user", "content": prompt}],
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    **params
+                )
+            except (APIStatusError, APIConnectionError, APITimeoutError) as e:
+                status, retry_after = _status_and_retry_after(e)
+                retryable = status is None or status in RETRY_STATUSES or status >= 500
+                if not retryable or attempt == self.max_retries:
+                    self.stats['failures'] += 1
+                    raise
+                self.stats['retries'] += 1
+                await asyncio.sleep(retry_delay(attempt, retry_after=retry_after))
+                continue
+
+            self.stats['requests'] += 1
+            return response, attempt + 1
+
+    async def complete(self, prompt: str, max_tokens: int = 100, temperature: float = 0.7,
+                       model: Optional[str] = None, **params) -> Dict[str, Any]:
+        """Yksi chat completion; palauttaa tekstin, token-käytön, latenssin ja yritysten määrän"""
+        estimate = self.estimate_tokens(prompt, max_tokens)
+        async with self.semaphore:
+            start = time.perf_counter()
+            response, attempts = await self._create(prompt, max_tokens, temperature, model, estimate, **params)
+
+            usage = response.usage
+            prompt_tokens = getattr(usage, 'prompt_tokens', 0) or 0
+            completion_tokens = getattr(usage, 'completion_tokens', 0) or 0
+            self.stats['prompt_tokens'] += prompt_tokens
+            self.stats['completion_tokens'] += completion_tokens
+            if usage is not None:
+                self.token_bucket.refund(max(0, estimate - prompt_tokens - completion_tokens))
+
+            return {
+                'text': (response.choices[0].message.content or '').strip(),
+                'model': response.model,
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'latency_s': time.perf_counter() - start,
+                'attempts': attempts,
+            }
+
+    async def stream(self, prompt: str, max_tokens: int = 100, temperature: float = 0.7,
+                     model: Optional[str] = None, usage: Optional[Dict[str, Any]] = None, **params):
+        """Async-generaattori vastauksen tekstipaloista (uusinta vain ennen ensimmäistä palaa).
+
+        Token-käyttö pyydetään viimeiseen palaan (stream_options.include_usage) ja
+        kirjoitetaan usage-dictiin: prompt_tokens, completion_tokens.
+        """
+        estimate = self.estimate_tokens(prompt, max_tokens)
+        params.setdefault('stream_options', {'include_usage': True})
+        async with self.semaphore:
+            response, _ = await self._create(prompt, max_tokens, temperature, model, estimate,
+                                             stream=True, **params)
+            async for chunk in response:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                if getattr(chunk, 'usage', None) is not None:
+                    prompt_tokens = chunk.usage.prompt_tokens or 0
+                    completion_tokens = chunk.usage.completion_tokens or 0
+                    self.stats['prompt_tokens'] += prompt_tokens
+                    self.stats['completion_tokens'] += completion_tokens
+                    self.token_bucket.refund(max(0, estimate - prompt_tokens - completion_tokens))
+                    if usage is not None:
+                        usage.update(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+    async def complete_many(self, prompts: List[str], return_exceptions: bool = True, **params) -> List[Any]:
+        """Kaikki promptit rinnakkain (semafori rajaa), tulokset samassa järjestyksessä"""
+        return await asyncio.gather(
+            *(self.complete(prompt, **params) for prompt in prompts),
+            return_exceptions=return_exceptions
+        )
+
+    def print_stats(self):
+        stats = self.stats
+        print(f"🔌 OpenAI: {stats['requests']} pyyntöä, {stats['retries']} uudelleenyritystä, "
+              f"{stats['failures']} epäonnistui, rate limit -odotus {stats['rate_limited_s']:.1f}s, "
+              f"{stats['prompt_tokens'] + stats['completion_tokens']} tokenia")
+
+    async def aclose(self):
+        await self.http_client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+
+def run_completions(prompts: List[str], **params) -> List[Any]:
+    """Synkroninen apufunktio skripteille: ajaa promptit rinnakkain ja sulkee poolin"""
+    provider_kwargs = {
+        key: params.pop(key) for key in
+        ('api_key', 'base_url', 'max_concurrency', 'requests_per_minute', 'tokens_per_minute', 'max_retries')
+        if key in params
+    }
+
+    async def run():
+        async with AsyncOpenAIProvider(**provider_kwargs) as provider:
+            results = await provider.complete_many(prompts, **params)
+            provider.print_stats()
+            return results
+
+    return asyncio.run(run())
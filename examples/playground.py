@@ -6,11 +6,11 @@ Tallentaa tulokset prompt_log.csv tiedostoon.
 """
 
 import os
-import csv
-import datetime
-from typing import Dict, Any
 from dotenv import load_dotenv
 
+from model_registry import default_inference_mode, get_registry
+from prompt_log import log_prompt_result
+
 # Lataa environment muuttujat
 load_dotenv()
 
@@ -32,46 +32,15 @@ def setup_openai():
 def setup_huggingface():
     """Alustaa Hugging Face API:n"""
     try:
-        from transformers import pipeline
-        print("✅ Hugging Face Transformers alustettu")
-        return pipeline
+        import transformers  # noqa: F401 - tarkistaa että kirjasto on asennettu
+        from model_registry import get_pipeline
+        print(f"✅ Hugging Face Transformers alustettu (INFERENCE_MODE={default_inference_mode()})")
+        # Sama kutsutapa kuin transformers.pipeline, mutta malli ladataan kerran per prosessi
+        return get_pipeline
     except ImportError:
         print("❌ Transformers kirjasto ei ole asennettu")
         return None
 
-def log_prompt_result(prompt: str, model: str, params: Dict[str, Any], result: str, notes: str = ""):
-    """Tallentaa prompt-testin tuloksen CSV-tiedostoon"""
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    # Luo logs kansio jos ei ole olemassa
-    os.makedirs("logs", exist_ok=True)
-    
-    # CSV tiedoston polku
-    csv_path = "logs/prompt_log.csv"
-    
-    # Tarkista onko tiedosto olemassa (header)
-    file_exists = os.path.exists(csv_path)
-    
-    with open(csv_path, 'a', newline='', encoding='utf-8') as csvfile:
-        fieldnames = ['date', 'prompt', 'model', 'params', 'result', 'notes']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        
-        # Kirjoita header jos tiedosto on uusi
-        if not file_exists:
-            writer.writeheader()
-        
-        # Kirjoita data
-        writer.writerow({
-            'date': timestamp,
-            'prompt': prompt,
-            'model': model, 
-            'params': str(params),
-            'result': result,
-            'notes': notes
-        })
-    
-    print(f"📝 Tallennettu: {csv_path}")
-
 def test_huggingface_basic():
     """Testaa Hugging Face API:a perusmalleilla"""
     pipeline = setup_huggingface()
@@ -90,7 +59,7 @@ def test_huggingface_basic():
         log_prompt_result(
             prompt=prompt,
             model="gpt2", 
-            params={"max_length": 50, "num_return_sequences": 1},
+            params={"max_length": 50, "num_return_sequences": 1, "inference_mode": default_inference_mode()},
             result=generated_text,
             notes="Basic text generation test"
         )
@@ -110,21 +79,20 @@ def test_openai_basic():
     
     print("\n🔥 === OPENAI TESTIT ===")
     
-    # Test 1: Basic completion
+    # Test 1: Basic completion (AsyncOpenAI: yhteyspooli, rate limit, retry)
     try:
+        from openai_async import run_completions
+        
         prompt = "Write a short poem about programming:"
-        response = openai.Completion.create(
-            engine="text-davinci-003",
-            prompt=prompt,
-            max_tokens=100,
-            temperature=0.7
-        )
+        response = run_completions([prompt], model="gpt-3.5-turbo", max_tokens=100, temperature=0.7)[0]
+        if isinstance(response, Exception):
+            raise response
         
-        result = response.choices[0].text.strip()
+        result = response['text']
         
         log_prompt_result(
             prompt=prompt,
-            model="text-davinci-003",
+            model=response['model'],
             params={"max_tokens": 100, "temperature": 0.7},
             result=result,
             notes="OpenAI basic completion test"
@@ -153,13 +121,18 @@ def run_prompt_experiments():
     Excited ->"""
     
     try:
+        from tokenizer_service import count_tokens
+        
         generator = pipeline("text-generation", model="gpt2")
-        result = generator(few_shot_prompt, max_length=len(few_shot_prompt.split()) + 5)
+        # max_length lasketaan tokeneina: prompt + 5 uutta tokenia
+        max_length = count_tokens(few_shot_prompt, "gpt2") + 5
+        result = generator(few_shot_prompt, max_length=max_length)
         
         log_prompt_result(
             prompt=few_shot_prompt,
             model="gpt2",
-            params={"max_length": len(few_shot_prompt.split()) + 5, "technique": "few-shot"},
+            params={"max_length": max_length, "technique": "few-shot",
+                    "inference_mode": default_inference_mode()},
             result=result[0]['generated_text'],
             notes="Few-shot learning test - emotion mapping"
         )
@@ -178,6 +151,7 @@ def main():
     test_huggingface_basic()
     test_openai_basic() 
     run_prompt_experiments()
+    get_registry().print_stats()
     
     print("\n✅ Playground testit suoritettu!")
     print("📊 Tulokset tallennettu: logs/prompt_log.csv")
@@ -0,0 +1,129 @@
+"""
+Prefix Cache - past_key_values yhteisille prompt-prefikseille
+Sama prompt eri sampling-parametreilla (temperature sweep, A/B-variantit)
+tai yhteinen alku (few-shot / CoT) lasketaan mallilla vain kerran.
+Välimuisti on muistissa, LRU-poisto kun PREFIX_CACHE_MAX_MB ylittyy.
+"""
+
+import copy
+import os
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+
+
+def cache_nbytes(past) -> int:
+    """KV-välimuistin tensorien koko tavuina"""
+    if hasattr(past, 'layers'):
+        tensors = [t for layer in past.layers for t in (layer.keys, layer.values) if t is not None]
+    else:
+        tensors = list(past.key_cache) + list(past.value_cache)
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+def common_prefix_length(a, b) -> int:
+    n = min(len(a), len(b))
+    for i in range(n):
+        if a[i] != b[i]:
+            return i
+    return n
+
+
+class PrefixCache:
+    """Token-prefiksi -> DynamicCache, pisin yhteinen prefiksi käytetään uudelleen"""
+
+    def __init__(self, max_bytes: Optional[int] = None, min_prefix_tokens: int = 8):
+        if max_bytes is None:
+            max_bytes = int(os.getenv('PREFIX_CACHE_MAX_MB', '256')) * 1024 * 1024
+        self.max_bytes = max_bytes
+        self.min_prefix_tokens = min_prefix_tokens
+        self._entries: "OrderedDict[Tuple[int, ...], Tuple[Any, int]]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.skipped_tokens = 0
+        self.computed_tokens = 0
+
+    def lookup(self, ids: List[int]):
+        """Palauttaa (kopio välimuistista rajattuna yhteiseen prefiksiin, pituus) tai (None, 0)"""
+        best_key, best_length = None, 0
+        for key in self._entries:
+            length = common_prefix_length(key, ids)
+            if length > best_length:
+                best_key, best_length = key, length
+        if best_key is None or best_length < self.min_prefix_tokens:
+            return None, 0
+
+        self._entries.move_to_end(best_key)
+        past = copy.deepcopy(self._entries[best_key][0])
+        if best_length < len(best_key):
+            past.crop(best_length)
+        return past, best_length
+
+    def prefill(self, model, ids: List[int]):
+        """past_key_values promptille ids[:-1]; viimeinen token jää generate()-kutsulle.
+
+        Palauttaa kopion jota generate() saa muokata, tai None jos prompt on
+        liian lyhyt hyötyäkseen.
+        """
+        from transformers import DynamicCache
+
+        target = len(ids) - 1
+        if target < self.min_prefix_tokens:
+            return None
+
+        past, reused = self.lookup(ids[:target])
+        self.skipped_tokens += reused
+        if reused == target:
+            self.hits += 1
+            return past
+
+        self.misses += 1
+        self.computed_tokens += target - reused
+        device = getattr(model, 'device', None)
+        with torch.no_grad():
+            outputs = model(
+                input_ids=torch.tensor([ids[reused:target]], device=device),
+                past_key_values=past if past is not None else DynamicCache(),
+                use_cache=True
+            )
+        past = outputs.past_key_values
+        self._store(tuple(ids[:target]), past)
+        return copy.deepcopy(past)
+
+    def _store(self, key: Tuple[int, ...], past):
+        size = cache_nbytes(past)
+        if size > self.max_bytes:
+            return  # Yksittäinen prefiksi ei mahdu rajaan
+        if key in self._entries:
+            self.bytes -= self._entries.pop(key)[1]
+        self._entries[key] = (past, size)
+        self.bytes += size
+
+        while self.bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.bytes -= evicted
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self._entries),
+            'mb': self.bytes / (1024 * 1024),
+            'evictions': self.evictions,
+            'skipped_tokens': self.skipped_tokens,
+            'computed_tokens': self.computed_tokens,
+        }
+
+    def print_stats(self):
+        stats = self.stats()
+        print(f"🧩 Prefix-välimuisti: {stats['skipped_tokens']} prompt-tokenia ohitettu, "
+              f"{stats['computed_tokens']} laskettu ({stats['hits']} täyttä osumaa, "
+              f"{stats['entries']} prefiksiä, {stats['mb']:.1f} MB, {stats['evictions']} poistettua)")
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
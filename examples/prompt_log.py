@@ -0,0 +1,36 @@
+"""
+Prompt Log - jaettu lokitus Day 2 skripteille
+Yksi log_prompt_result playgroundille, prompt_experimentsille ja
+lightweight_testsille. Tiedosto avataan kerran per prosessi, rivit
+puskuroidaan ja kirjoitetaan lukon alla (säikeet + prosessit).
+"""
+
+import datetime
+from typing import Any, Dict, Optional, Set
+
+from result_sink import PROMPT_LOG_PATH, PROMPT_LOG_SCHEMA, open_sink
+
+
+def log_prompt_result(prompt: str, model: str, params: Dict[str, Any], result: str, notes: str = "",
+                      job_id: Optional[str] = None):
+    """Tallentaa prompt-testin tuloksen CSV-tiedostoon (job_id -> checkpoint)"""
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    open_sink(PROMPT_LOG_PATH, PROMPT_LOG_SCHEMA).write({
+        'date': timestamp,
+        'prompt': prompt,
+        'model': model,
+        'params': str(params),
+        'result': result,
+        'notes': notes
+    }, job_id=job_id)
+
+
+def flush_prompt_log():
+    """Kirjoittaa puskuroidut rivit levylle (esim. ennen lokin lukemista)"""
+    open_sink(PROMPT_LOG_PATH, PROMPT_LOG_SCHEMA).flush()
+
+
+def completed_prompt_jobs() -> Set[str]:
+    """prompt_log.csv:hen jo kirjatut job-tunnisteet"""
+    return open_sink(PROMPT_LOG_PATH, PROMPT_LOG_SCHEMA).completed_job_ids()
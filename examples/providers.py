@@ -0,0 +1,392 @@
+"""
+Providers - yhteinen rajapinta generointibackendeille
+Jokainen provider tarjoaa generate(), generate_batch() ja stream().
+Mallinimi valitsee providerin etuliitteellä:
+  gpt2, distilgpt2          -> Hugging Face paikallisesti (hf:)
+  openai:gpt-3.5-turbo      -> OpenAI (AsyncOpenAI, pooli + rate limit)
+  fake:echo                 -> deterministinen fake offline-ajoihin
+dispatch() ajaa eri providereiden jobit rinnakkain, joten kahden
+backendin A/B kestää max(latenssi) eikä summaa. Jokainen tulos sisältää
+prompt_tokens- ja completion_tokens-kentät kustannuskirjanpitoa varten.
+"""
+
+import asyncio
+import atexit
+import hashlib
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+PROVIDER_PREFIXES = ('hf', 'openai', 'fake')
+
+
+def stream_metrics(start: float, token_times: List[float]) -> Dict[str, Any]:
+    """Time-to-first-token, keskimääräinen tokenien väli ja tokenit/s"""
+    if not token_times:
+        return {'ttft_s': None, 'inter_token_ms': None, 'tokens_per_s': 0.0, 'generated_tokens': 0}
+
+    total = token_times[-1] - start
+    gaps = [b - a for a, b in zip(token_times, token_times[1:])]
+    return {
+        'ttft_s': token_times[0] - start,
+        'inter_token_ms': 1000 * sum(gaps) / len(gaps) if gaps else None,
+        'tokens_per_s': len(token_times) / total if total > 0 else 0.0,
+        'generated_tokens': len(token_times),
+    }
+
+
+def split_model(model: str):
+    """'openai:gpt-4o' -> ('openai', 'gpt-4o'); ilman etuliitettä Hugging Face"""
+    prefix, sep, name = model.partition(':')
+    if sep and prefix in PROVIDER_PREFIXES:
+        return prefix, name
+    return 'hf', model
+
+
+class Provider:
+    """Generointirajapinta: pyyntö on dict {'prompt', 'temperature', 'max_new_tokens', ...}.
+
+    Tulos on dict: {'text', 'model', 'latency_s', 'prompt_tokens',
+    'completion_tokens', ...}; providerikohtaiset lisäkentät (esim.
+    truncation_info) kulkevat mukana.
+    """
+
+    name = 'provider'
+
+    def generate(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        return self.generate_batch([request])[0]
+
+    def generate_batch(self, requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def stream(self, request: Dict[str, Any], metrics: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        """Oletus: koko vastaus yhtenä palana"""
+        result = self.generate(request)
+        if metrics is not None:
+            metrics['ttft_s'] = result['latency_s']
+        yield result['text']
+
+    def close(self):
+        """Vapauttaa providerin resurssit (oletus: ei mitään)"""
+
+
+class HFLocalProvider(Provider):
+    """Paikallinen Hugging Face -malli BatchGeneratorin kautta (välimuistit, seedit, batchit)"""
+
+    name = 'hf'
+
+    def __init__(self, model_name: str = "gpt2", mode: Optional[str] = None,
+                 backend: Optional[str] = None, seed: Optional[int] = None, use_prefix_cache: bool = True):
+        from generation_cache import DEFAULT_SEED, GenerationCache
+        from hf_generation import BatchGenerator
+        from model_registry import default_backend, get_registry
+        from prefix_cache import PrefixCache
+
+        self.model_name = model_name
+        self.backend = backend or default_backend()
+        self.model, self.tokenizer = get_registry().model_and_tokenizer(model_name, mode=mode, backend=self.backend)
+        # Seedattu sampling + levyvälimuisti: muuttumattomat testit eivät aja mallia
+        self.cache = GenerationCache()
+        # Sama prompt eri parametreilla lasketaan KV-välimuistiin kerran (ONNX-graafi hoitaa omansa)
+        self.prefix_cache = PrefixCache() if use_prefix_cache and self.backend == 'torch' else None
+        self.generator = BatchGenerator(
+            self.model, self.tokenizer,
+            cache=self.cache, seed=DEFAULT_SEED if seed is None else seed, prefix_cache=self.prefix_cache
+        )
+        self._lock = threading.Lock()  # Yksi malli: generate-kutsut vuorotellen
+
+    def generate_batch(self, requests):
+        info = []
+        with self._lock:
+            start = time.perf_counter()
+            texts = self.generator.generate(requests, info)
+            elapsed = time.perf_counter() - start
+        # Completion-tokenit samalla (kerran ladatulla) tokenizerilla; myös välimuistiosumille
+        return [
+            dict(details, text=text, model=self.model_name, latency_s=elapsed,
+                 completion_tokens=count)
+            for text, details, count in zip(texts, info, self.generator.tokens.count_batch(texts))
+        ]
+
+    def stream(self, request, metrics=None):
+        """Generointi workerissa lukon alla, palat jonon kautta.
+
+        Lukko vapautuu kun generointi on valmis, vaikka kuluttaja pysähtyisi
+        tai hylkäisi generaattorin kesken.
+        """
+        pieces = queue.Queue()
+        done = object()
+        worker_metrics = {}
+
+        def run():
+            try:
+                with self._lock:
+                    for piece in self.generator.stream(request, worker_metrics):
+                        pieces.put(piece)
+            except Exception as e:
+                pieces.put(e)
+            finally:
+                pieces.put(done)
+
+        threading.Thread(target=run, daemon=True).start()
+        while True:
+            piece = pieces.get()
+            if piece is done:
+                break
+            if isinstance(piece, Exception):
+                raise piece
+            yield piece
+        if metrics is not None:
+            metrics.update(worker_metrics)
+
+    def score(self, prompts, texts):
+        """Vastausten token-logprob ja perplexity batchatulla forward passilla (ei generointia)"""
+        from quality_metrics import sequence_logprobs
+
+        with self._lock:
+            return sequence_logprobs(self.model, self.generator.tokens, prompts, texts,
+                                     batch_size=self.generator.batch_size)
+
+
+class OpenAIProvider(Provider):
+    """OpenAI chat completions (openai_async: yhteyspooli, semafori, rate limit, retry).
+
+    Yksi AsyncOpenAIProvider ja yksi event loop omassa säikeessään per
+    instanssi: yhteydet ja rate limitit jaetaan kaikkien kutsujen kesken.
+    Kutsut voivat tulla mistä säikeestä tahansa (dispatch).
+    """
+
+    name = 'openai'
+    UNSUPPORTED = ('seed', 'sample', 'truncation', 'do_sample', 'max_length', 'num_return_sequences')
+
+    def __init__(self, model_name: str = "gpt-3.5-turbo", **provider_kwargs):
+        self.model_name = model_name
+        self.provider_kwargs = provider_kwargs
+        self._loop = None
+        self._thread = None
+        self._client = None
+        self._start_lock = threading.Lock()
+
+    def _run(self, coroutine):
+        """Ajaa coroutinen providerin loopissa ja odottaa tuloksen"""
+        with self._start_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    async def _provider(self):
+        # Luodaan loopin sisällä: semafori ja httpx-pooli sidotaan tähän looppiin
+        if self._client is None:
+            from openai_async import AsyncOpenAIProvider
+            self._client = AsyncOpenAIProvider(model=self.model_name, **self.provider_kwargs)
+        return self._client
+
+    def _params(self, request):
+        params = {k: v for k, v in request.items() if k != 'prompt' and k not in self.UNSUPPORTED}
+        if 'max_new_tokens' in params:
+            params['max_tokens'] = params.pop('max_new_tokens')
+        return params
+
+    def generate_batch(self, requests):
+        async def run():
+            provider = await self._provider()
+            return await asyncio.gather(
+                *(provider.complete(request['prompt'], **self._params(request)) for request in requests),
+                return_exceptions=True
+            )
+
+        results = []
+        for result in self._run(run()):
+            if isinstance(result, Exception):
+                result = {'text': f"Error: {str(result)}", 'model': self.model_name, 'latency_s': 0.0,
+                          'prompt_tokens': 0, 'completion_tokens': 0}
+            results.append(result)
+        return results
+
+    def stream(self, request, metrics=None):
+        provider = self._run(self._provider())
+        usage = {}  # Viimeisen palan token-käyttö (stream_options.include_usage)
+        pieces = provider.stream(request['prompt'], usage=usage, **self._params(request))
+        start = time.perf_counter()
+        token_times = []
+        try:
+            while True:
+                try:
+                    piece = self._run(pieces.__anext__())
+                except StopAsyncIteration:
+                    break
+                token_times.append(time.perf_counter())
+                yield piece
+        finally:
+            # Kesken jätetty stream: vastaus suljetaan ja semafori vapautuu
+            self._run(pieces.aclose())
+        if metrics is not None:
+            metrics.update(stream_metrics(start, token_times))  # Palat, ei tokenit
+            metrics.update(usage)
+
+    def close(self):
+        """Sulkee yhteyspoolin ja pysäyttää loopin (idempotentti)"""
+        with self._start_lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        if self._client is not None:
+            asyncio.run_coroutine_threadsafe(self._client.aclose(), loop).result()
+            self._client = None
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join()
+        loop.close()
+
+
+class FakeProvider(Provider):
+    """Deterministinen fake: sama pyyntö -> sama teksti, valinnainen keinotekoinen viive"""
+
+    name = 'fake'
+
+    def __init__(self, model_name: str = "echo", latency_s: float = 0.0):
+        self.model_name = model_name
+        self.latency_s = latency_s
+
+    def _text(self, request):
+        digest = hashlib.sha256(repr(sorted(request.items())).encode('utf-8')).hexdigest()[:8]
+        words = request['prompt'].split()[-5:]
+        return f"[{self.model_name} {digest}] " + ' '.join(words)
+
+    def generate_batch(self, requests):
+        start = time.perf_counter()
+        time.sleep(self.latency_s)
+        results = []
+        for request in requests:
+            text = self._text(request)
+            results.append({
+                'text': text, 'model': self.model_name, 'latency_s': time.perf_counter() - start,
+                'prompt_tokens': len(request['prompt'].split()), 'completion_tokens': len(text.split()),
+            })
+        return results
+
+    def stream(self, request, metrics=None):
+        start = time.perf_counter()
+        token_times = []
+        text = self._text(request)
+        for word in text.split(' '):
+            time.sleep(self.latency_s / 10)
+            token_times.append(time.perf_counter())
+            yield word + ' '
+        if metrics is not None:
+            metrics.update(stream_metrics(start, token_times))
+            # Samat token-luvut kuin generate_batchissa (usage-kirjanpito)
+            metrics.update(prompt_tokens=len(request['prompt'].split()), completion_tokens=len(text.split()))
+
+
+def estimate_tokens(job: Dict[str, Any]):
+    """Budjettiarvio jobille: (prompt-tokenit ~4 merkkiä/token, completionin yläraja)"""
+    params = job['params']
+    max_tokens = params.get('max_new_tokens') or params.get('max_tokens') or params.get('max_length') or 150
+    return len(job['prompt']) // 4 + 1, max_tokens
+
+
+_PROVIDER_CLASSES = {
+    'hf': HFLocalProvider,
+    'openai': OpenAIProvider,
+    'fake': FakeProvider,
+}
+
+
+class ProviderPool:
+    """Luo providerit laiskasti mallinimen perusteella ja jakaa ne kutsujille"""
+
+    def __init__(self, factory: Optional[Callable[[str, str], Provider]] = None, usage=None):
+        self.factory = factory or (lambda prefix, name: _PROVIDER_CLASSES[prefix](name))
+        self.usage = usage  # UsageTracker: budjettitarkistus ennen kutsua, kirjaus jälkeen
+        self._providers = {}
+        self._lock = threading.Lock()
+
+    def get(self, model: str) -> Provider:
+        prefix, name = split_model(model)
+        with self._lock:
+            if model not in self._providers:
+                self._providers[model] = self.factory(prefix, name)
+            return self._providers[model]
+
+    def providers(self) -> Dict[str, Provider]:
+        return dict(self._providers)
+
+    def close(self):
+        """Sulkee kaikki providerit (esim. OpenAI-yhteyspoolit)"""
+        with self._lock:
+            providers, self._providers = list(self._providers.values()), {}
+        for provider in providers:
+            provider.close()
+
+    def reserve(self, jobs: List[Dict[str, Any]]):
+        """Varaa budjetista kaikkien jobien pahimman tapauksen kerralla (nostaa BudgetExceeded).
+
+        Jobin varaus tallennetaan kenttään 'reserved_usd'; record() vapauttaa sen.
+        """
+        if self.usage is None:
+            return
+        estimates = self.usage.reserve([(job['model'], *estimate_tokens(job)) for job in jobs])
+        for job, estimate in zip(jobs, estimates):
+            job['reserved_usd'] = estimate
+
+    def record(self, job: Dict[str, Any], result: Dict[str, Any]):
+        """Kirjaa toteutuneen käytön, vapauttaa varauksen ja lisää tulokseen cost_usd"""
+        if self.usage is None:
+            return
+        result['cost_usd'] = self.usage.record(
+            job.get('category', ''), job['model'],
+            result.get('prompt_tokens', 0) or 0,
+            result.get('completion_tokens', result.get('generated_tokens', 0)) or 0,
+            reserved_usd=job.pop('reserved_usd', 0.0)
+        )
+
+    def dispatch(self, jobs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Ajaa jobit providereittain rinnakkain; tulokset jobien järjestyksessä.
+
+        Job on dict {'model', 'prompt', 'params'}; saman providerin jobit
+        menevät yhtenä generate_batch-kutsuna (batchaus + välimuistit).
+        Budjetti tarkistetaan ennen ajoa (BudgetExceeded).
+        """
+        self.reserve(jobs)
+        by_model = {}
+        for index, job in enumerate(jobs):
+            by_model.setdefault(job['model'], []).append(index)
+
+        def run(model, indices):
+            requests = [dict(jobs[i]['params'], prompt=jobs[i]['prompt']) for i in indices]
+            try:
+                return self.get(model).generate_batch(requests)
+            except Exception as e:
+                return [{'text': f"Error: {str(e)}", 'model': model, 'latency_s': 0.0} for _ in indices]
+
+        results = [None] * len(jobs)
+        if len(by_model) == 1:
+            (model, indices), = by_model.items()
+            for index, result in zip(indices, run(model, indices)):
+                results[index] = result
+        else:
+            with ThreadPoolExecutor(max_workers=len(by_model)) as executor:
+                futures = {model: executor.submit(run, model, indices) for model, indices in by_model.items()}
+                for model, future in futures.items():
+                    for index, result in zip(by_model[model], future.result()):
+                        results[index] = result
+
+        for job, result in zip(jobs, results):
+            self.record(job, result)
+        return results
+
+
+_pool = None
+
+
+def get_provider(model: str) -> Provider:
+    """Prosessin jaettu provider mallinimelle (esim. 'gpt2', 'openai:gpt-4o-mini', 'fake:echo')"""
+    global _pool
+    if _pool is None:
+        _pool = ProviderPool()
+    return _pool.get(model)
@@ -0,0 +1,199 @@
+"""
+Quality Metrics - vastausten laatumittarit parametrisweepeille
+Lasketaan kerralla koko sweepin riveille: toistoaste, distinct-1/2,
+self-BLEU saman konfiguraation näytteiden välillä sekä vastauksen
+keskimääräinen token-logprob ja perplexity referenssimallilla
+(batchattu forward pass, ei generointia). Tulokset kirjataan lokiin
+sarakkeina, joten A/B-variantit voidaan järjestää numeroilla.
+"""
+
+import math
+import os
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from log_analytics import distinct_n, iter_log_chunks, ngram_hashes
+
+QUALITY_COLUMNS = ('repetition_rate', 'distinct_1', 'distinct_2', 'self_bleu', 'mean_logprob', 'perplexity')
+
+# Rivit, joilla on sama konfiguraatio (vain näyte eroaa) -> self-BLEU
+SAMPLE_GROUP_COLUMNS = ['category', 'model', 'prompt', 'temperature', 'top_p', 'max_tokens', 'variant_name']
+
+
+def default_scorer_model() -> Optional[str]:
+    """QUALITY_SCORER_MODEL ympäristöstä (oletus tyhjä = ei logprob-mittareita)"""
+    return os.getenv('QUALITY_SCORER_MODEL', '') or None
+
+
+def default_quality_samples() -> int:
+    """QUALITY_SAMPLES ympäristöstä: näytettä per sweep-konfiguraatio (oletus 1 = ei self-BLEU:ta)"""
+    return max(1, int(os.getenv('QUALITY_SAMPLES', '1') or 1))
+
+
+def repetition_rate(texts: pd.Series, n: int = 3) -> pd.Series:
+    """Osuus vastauksen n-grammeista, jotka toistavat saman vastauksen aiempaa n-grammia"""
+    hashes = ngram_hashes(texts, n)
+    repeated = pd.DataFrame({'row': hashes.index, 'gram': hashes.to_numpy()}).duplicated()
+    return repeated.groupby(hashes.index).mean().reindex(texts.index)
+
+
+def _ngrams(tokens: List[str], n: int) -> Counter:
+    return Counter(tuple(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+
+
+def bleu(hypothesis: List[str], references: List[List[str]], max_n: int = 4) -> float:
+    """Sentence-BLEU (tasapainotettu 1-4, +1-tasoitus n > 1) usealla referenssillä"""
+    if not hypothesis or not references:
+        return float('nan')
+    log_precision = 0.0
+    for n in range(1, max_n + 1):
+        counts = _ngrams(hypothesis, n)
+        max_ref = Counter()
+        for reference in references:
+            max_ref |= _ngrams(reference, n)
+        matches = sum(min(count, max_ref[gram]) for gram, count in counts.items())
+        total = sum(counts.values())
+        if n == 1 and matches == 0:
+            return 0.0
+        smoothing = 1 if n > 1 else 0
+        log_precision += math.log((matches + smoothing) / (total + smoothing)) / max_n
+
+    # Brevity penalty lähimmän referenssin pituuteen
+    closest = min((len(reference) for reference in references), key=lambda length: (abs(length - len(hypothesis)), length))
+    penalty = 1.0 if len(hypothesis) > closest else math.exp(1 - closest / len(hypothesis))
+    return penalty * math.exp(log_precision)
+
+
+def self_bleu(texts: pd.Series, groups: pd.Series) -> pd.Series:
+    """Jokaisen vastauksen BLEU saman ryhmän muita näytteitä vastaan (NaN jos ryhmässä yksi)"""
+    tokens = texts.dropna().str.lower().str.split()
+    result = pd.Series(np.nan, index=texts.index)
+    for _, members in tokens.groupby(groups[tokens.index].to_numpy(), sort=False):
+        if len(members) < 2:
+            continue
+        rows = list(members.items())
+        for index, hypothesis in rows:
+            references = [reference for other, reference in rows if other != index]
+            result[index] = bleu(hypothesis, references)
+    return result
+
+
+def sequence_logprobs(model, tokens, prompts: Sequence[str], texts: Sequence[str],
+                      batch_size: int = 8, max_length: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Vastauksen keskimääräinen token-logprob ja perplexity promptin jatkona.
+
+    tokens on TokenizerService. Prompt + vastaus ajetaan forward passina
+    batch kerrallaan (pituusjärjestyksessä, oikealle täytettynä); vain
+    vastauksen tokenit pisteytetään.
+    """
+    import torch
+
+    tokenizer = tokens.tokenizer
+    max_length = max_length or getattr(model.config, 'n_positions', None) or 1024
+    pad_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+    start_id = tokenizer.bos_token_id if tokenizer.bos_token_id is not None else tokenizer.eos_token_id
+    empty = {'mean_logprob': float('nan'), 'perplexity': float('nan'), 'scored_tokens': 0}
+    results = [dict(empty) for _ in texts]
+
+    rows = []
+    for index, (prompt_ids, text_ids) in enumerate(zip(tokens.encode_batch(list(prompts)),
+                                                       tokens.encode_batch(list(texts)))):
+        if not text_ids:
+            continue
+        text_ids = list(text_ids[:max_length - 1])
+        # Konteksti lyhennetään vasemmalta; vähintään yksi token ennen vastausta
+        context = list(prompt_ids[len(prompt_ids) - (max_length - len(text_ids)):]) or [start_id]
+        rows.append((index, context + text_ids, len(context)))
+    rows.sort(key=lambda row: len(row[1]))
+
+    device = getattr(model, 'device', 'cpu')
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        width = max(len(ids) for _, ids, _ in batch)
+        input_ids = torch.full((len(batch), width), pad_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(batch), width), dtype=torch.long)
+        scored = torch.zeros((len(batch), width), dtype=torch.bool)
+        for row, (_, ids, context_length) in enumerate(batch):
+            input_ids[row, :len(ids)] = torch.tensor(ids)
+            attention_mask[row, :len(ids)] = 1
+            scored[row, context_length:len(ids)] = True
+
+        with torch.inference_mode():
+            logits = model(input_ids=input_ids.to(device), attention_mask=attention_mask.to(device)).logits
+        logprobs = torch.log_softmax(logits[:, :-1].float().cpu(), dim=-1)
+        token_logprobs = logprobs.gather(-1, input_ids[:, 1:, None]).squeeze(-1)
+        mask = scored[:, 1:]
+        counts = mask.sum(dim=1)
+        means = (token_logprobs * mask).sum(dim=1) / counts.clamp(min=1)
+
+        for (index, _, _), mean, count in zip(batch, means.tolist(), counts.tolist()):
+            results[index] = {'mean_logprob': mean, 'perplexity': math.exp(-mean), 'scored_tokens': count}
+    return results
+
+
+def add_quality_metrics(frame: pd.DataFrame, scorer=None) -> pd.DataFrame:
+    """Lisää QUALITY_COLUMNS-sarakkeet riveille (sarakkeet: prompt, response + ryhmäsarakkeet).
+
+    scorer(prompts, texts) palauttaa sequence_logprobs-muotoiset tulokset;
+    ilman sitä mean_logprob ja perplexity jäävät tyhjiksi. Virheriveille
+    ei lasketa mittareita.
+    """
+    frame = frame.reset_index(drop=True)
+    text = frame['response'].astype('string')
+    text = text.where(~text.fillna('').str.startswith('Error:'))
+
+    frame['repetition_rate'] = repetition_rate(text)
+    frame['distinct_1'] = distinct_n(text, 1)
+    frame['distinct_2'] = distinct_n(text, 2)
+
+    keys = frame.reindex(columns=SAMPLE_GROUP_COLUMNS).astype('string').fillna('-')
+    frame['self_bleu'] = self_bleu(text, keys.groupby(SAMPLE_GROUP_COLUMNS, sort=False).ngroup())
+
+    frame['mean_logprob'] = np.nan
+    frame['perplexity'] = np.nan
+    valid = (text.str.len() > 0).fillna(False).astype(bool)
+    if scorer is not None and valid.any():
+        scores = scorer(frame.loc[valid, 'prompt'].fillna('').tolist(), text[valid].tolist())
+        frame.loc[valid, 'mean_logprob'] = [score['mean_logprob'] for score in scores]
+        frame.loc[valid, 'perplexity'] = [score['perplexity'] for score in scores]
+    return frame
+
+
+def load_sweep(path: str, schema: Dict[str, type], category: str) -> pd.DataFrame:
+    """Yhden kategorian rivit lokista (luetaan paloittain, vain tarvittavat sarakkeet)"""
+    columns = ['test_category', 'variant_name', 'temperature', 'top_p', 'max_tokens', *QUALITY_COLUMNS]
+    parts = [chunk[chunk['test_category'] == category]
+             for chunk in iter_log_chunks(path, schema, columns=columns)]
+    parts = [part for part in parts if not part.empty]
+    if not parts:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(parts, ignore_index=True).reindex(columns=columns)
+
+
+def rank_variants(frame: pd.DataFrame, by: str = 'variant_name') -> pd.DataFrame:
+    """Varianttien keskiarvot ja järjestys.
+
+    Sijoitus on kolmen sijan keskiarvo: perplexity (pienempi = johdonmukaisempi),
+    distinct-2 (suurempi = monipuolisempi) ja toistoaste (pienempi parempi).
+    """
+    metrics = frame.groupby(by)[list(QUALITY_COLUMNS)].mean()
+    metrics.insert(0, 'rows', frame.groupby(by).size())
+    ranks = pd.concat([
+        metrics['perplexity'].rank(ascending=True),
+        metrics['distinct_2'].rank(ascending=False),
+        metrics['repetition_rate'].rank(ascending=True),
+    ], axis=1)
+    metrics['score_rank'] = ranks.mean(axis=1, skipna=True)
+    return metrics.sort_values('score_rank')
+
+
+def print_ranking(ranking: pd.DataFrame, title: str = "VARIANTTIEN JÄRJESTYS"):
+    print(f"\n🏆 === {title} ===")
+    if ranking.empty:
+        print("   (ei rivejä)")
+        return
+    with pd.option_context('display.width', 160, 'display.max_columns', None):
+        print(ranking.dropna(axis=1, how='all').to_string(float_format=lambda value: f"{value:.3g}"))
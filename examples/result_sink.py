@@ -0,0 +1,291 @@
+"""
+Result Sink - append-only tuloslokit
+Puskuroitu CSV-kirjoittaja kiinteällä skeemalla ja valinnainen
+sarakemuotoinen (Parquet) kopio analyysia varten.
+"""
+
+import atexit
+import csv
+import io
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional, Set
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# prompt_log.csv (playground, prompt_experiments, lightweight_tests)
+PROMPT_LOG_PATH = "logs/prompt_log.csv"
+PROMPT_LOG_SCHEMA = {
+    'date': str,
+    'prompt': str,
+    'model': str,
+    'params': str,
+    'result': str,
+    'notes': str,
+}
+
+# Sama sarakejärjestys kuin aiemmalla pandas-concat -lokilla
+DAY03_LOG_PATH = "logs/day03_advanced_prompts.csv"
+DAY03_LOG_SCHEMA = {
+    'test_category': str,
+    'prompt': str,
+    'temperature': float,
+    'model': str,
+    'response': str,
+    'notes': str,
+    'timestamp': str,
+    'day': int,
+    'top_p': float,
+    'max_tokens': int,
+    'variant_name': str,
+    # Streaming-mittarit (test_parameter_ab_testing)
+    'ttft_s': float,
+    'inter_token_ms': float,
+    'tokens_per_s': float,
+    # Kutsun kokonaislatenssi (batchissa koko batchin kesto)
+    'latency_s': float,
+    # Promptin lyhennys (max_input_length)
+    'prompt_tokens': int,
+    'truncated_tokens': int,
+    'truncation': str,
+    # Mallin tarkkuus (fp32 / bf16 / int8) ja backend (torch / onnx)
+    'inference_mode': str,
+    'backend': str,
+    # Token- ja kustannuskirjanpito (usage_accounting)
+    'completion_tokens': int,
+    'cost_usd': float,
+    # Laatumittarit (quality_metrics): sweepin rivit kerralla
+    'repetition_rate': float,
+    'distinct_1': float,
+    'distinct_2': float,
+    'self_bleu': float,
+    'mean_logprob': float,
+    'perplexity': float,
+}
+
+_ARROW_TYPES = {str: 'string', float: 'float64', int: 'int64'}
+
+
+class FileLock:
+    """Prosessien välinen lukko sivutiedostolla (<polku>.lock)"""
+
+    def __init__(self, path: str):
+        self._handle = open(path + ".lock", 'a+b')
+
+    def __enter__(self):
+        if fcntl is not None:
+            fcntl.flock(self._handle.fileno(), fcntl.LOCK_EX)
+        else:
+            self._handle.seek(0)
+            msvcrt.locking(self._handle.fileno(), msvcrt.LK_LOCK, 1)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self._handle.fileno(), fcntl.LOCK_UN)
+        else:
+            self._handle.seek(0)
+            msvcrt.locking(self._handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def close(self):
+        self._handle.close()
+
+
+class ResultSink:
+    """Kirjoittaa tulosrivit puskuroituna CSV:n loppuun (ei koskaan lue/kirjoita koko tiedostoa)"""
+
+    def __init__(self, path: str, schema: Dict[str, type], flush_every: int = 50,
+                 flush_interval: float = 5.0, columnar_dir: Optional[str] = None):
+        self.path = path
+        self.schema = schema
+        self.fieldnames = list(schema)
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.rows_written = 0
+
+        self._buffer = []
+        self._done_buffer = []
+        self._done_file = None
+        self.checkpoint_path = path + ".done"
+        self._last_flush = time.monotonic()
+        self._thread_lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Säikeet jakavat puskurin, prosessit synkronoidaan tiedostolukolla
+        self._file_lock = FileLock(path)
+        with self._file_lock:
+            self._migrate_header()
+            self._file = open(path, 'a', newline='', encoding='utf-8')
+            if os.fstat(self._file.fileno()).st_size == 0:
+                self._file.write(self._format_rows([], header=True))
+                self._file.flush()
+
+        self._parquet = None
+        if columnar_dir:
+            self._open_columnar(columnar_dir)
+
+        atexit.register(self.close)
+
+    def _migrate_header(self):
+        """Muuntaa vanhan skeeman tiedoston kerran uuteen sarakejärjestykseen"""
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return
+
+        with open(self.path, 'r', newline='', encoding='utf-8') as f:
+            header = next(csv.reader(f), [])
+        if header == self.fieldnames:
+            return
+
+        print(f"🔄 Päivitetään {self.path} uuteen skeemaan...")
+        tmp_path = self.path + ".tmp"
+        with open(self.path, 'r', newline='', encoding='utf-8') as src, \
+                open(tmp_path, 'w', newline='', encoding='utf-8') as dst:
+            writer = csv.DictWriter(dst, fieldnames=self.fieldnames, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(csv.DictReader(src))
+        os.replace(tmp_path, self.path)
+
+    def _open_columnar(self, columnar_dir):
+        """Avaa Parquet-kirjoittajan (vaatii pyarrow-kirjaston)"""
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            print("⚠️  pyarrow puuttuu - Parquet-kopio ohitetaan (pip install pyarrow)")
+            return
+
+        os.makedirs(columnar_dir, exist_ok=True)
+        # Yksi part-tiedosto per ajo; pd.read_parquet(columnar_dir) lukee kaikki
+        part_name = f"part-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.parquet"
+        self._arrow_schema = pa.schema([
+            (name, getattr(pa, _ARROW_TYPES[kind])()) for name, kind in self.schema.items()
+        ])
+        self._parquet = pq.ParquetWriter(os.path.join(columnar_dir, part_name), self._arrow_schema)
+
+    def write(self, row: Dict[str, Any], job_id: Optional[str] = None):
+        """Lisää rivin puskuriin ja tyhjentää puskurin tarvittaessa.
+
+        job_id kirjataan valmiiksi (<polku>.done) vasta kun rivi on levyllä.
+        """
+        unknown = set(row) - set(self.schema)
+        if unknown:
+            raise ValueError(f"Tuntemattomat sarakkeet {sorted(unknown)} ({self.path})")
+
+        with self._thread_lock:
+            if self._file.closed:
+                raise ValueError(f"Kirjoitus suljettuun sinkkiin ({self.path})")
+            self._buffer.append(row)
+            if job_id is not None:
+                self._done_buffer.append(job_id)
+            if (len(self._buffer) >= self.flush_every
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self._flush_locked()
+
+    def flush(self):
+        """Kirjoittaa puskuroidut rivit levylle"""
+        with self._thread_lock:
+            self._flush_locked()
+
+    def _format_rows(self, rows, header=False):
+        """Muotoilee rivit valmiiksi CSV-tekstiksi yhtä kirjoitusta varten"""
+        text = io.StringIO()
+        writer = csv.DictWriter(text, fieldnames=self.fieldnames)
+        if header:
+            writer.writeheader()
+        writer.writerows(rows)
+        return text.getvalue()
+
+    def _flush_locked(self):
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        if self._file.closed:
+            # Ei koskaan pudoteta rivejä hiljaa
+            raise ValueError(f"{len(self._buffer)} riviä kirjoittamatta: sinkki on suljettu ({self.path})")
+
+        # O_APPEND + lukko: rinnakkaisten prosessien rivit eivät lomitu
+        text = self._format_rows(self._buffer)
+        with self._file_lock:
+            self._file.write(text)
+            self._file.flush()
+            if self._done_buffer:
+                # Checkpoint vasta rivien jälkeen: kaatuminen ei merkitse kirjoittamatonta valmiiksi
+                if self._done_file is None:
+                    self._done_file = open(self.checkpoint_path, 'a', encoding='utf-8')
+                self._done_file.write(''.join(f"{job_id}\n" for job_id in self._done_buffer))
+                self._done_file.flush()
+
+        if self._parquet is not None:
+            import pyarrow as pa
+            table = pa.Table.from_pylist(
+                [self._coerce(row) for row in self._buffer], schema=self._arrow_schema
+            )
+            self._parquet.write_table(table)
+
+        self.rows_written += len(self._buffer)
+        self._buffer = []
+        self._done_buffer = []
+
+    def completed_job_ids(self) -> Set[str]:
+        """Aiemmin valmiiksi kirjatut job-tunnisteet (resume)"""
+        if not os.path.exists(self.checkpoint_path):
+            return set()
+        with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+            return {line.strip() for line in f if line.strip()}
+
+    def _coerce(self, row):
+        """Muuntaa rivin arvot skeeman tyypeiksi (puuttuvat -> None)"""
+        coerced = {}
+        for name, kind in self.schema.items():
+            value = row.get(name)
+            coerced[name] = None if value is None or value == '' else kind(value)
+        return coerced
+
+    def close(self):
+        """Tyhjentää puskurin ja sulkee tiedostot"""
+        with self._thread_lock:
+            if self._file.closed:
+                return
+            self._flush_locked()
+            self._file.close()
+            self._file_lock.close()
+            if self._done_file is not None:
+                self._done_file.close()
+            if self._parquet is not None:
+                self._parquet.close()
+                self._parquet = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def columnar_dir_for(name: str) -> Optional[str]:
+    """Parquet-hakemisto lokille, jos RESULTS_PARQUET_DIR on asetettu"""
+    base = os.getenv('RESULTS_PARQUET_DIR')
+    return os.path.join(base, name) if base else None
+
+
+_sinks = {}
+_sinks_lock = threading.Lock()
+
+
+def open_sink(path: str, schema: Dict[str, type], **kwargs) -> ResultSink:
+    """Palauttaa prosessin jaetun sinkin polulle (avataan vain kerran)"""
+    with _sinks_lock:
+        sink = _sinks.get(path)
+        if sink is None or sink._file.closed:
+            sink = ResultSink(path, schema, **kwargs)
+            _sinks[path] = sink
+        return sink
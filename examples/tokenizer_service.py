@@ -0,0 +1,95 @@
+"""
+Tokenizer Service - nopea tokenizer kerran per malli + LRU-muisti
+Lataa fast (Rust) -tokenizerin kerran prosessissa, muistaa toistuvien
+promptien enkoodaukset (LRU) ja tarjoaa batch-enkoodauksen sekä tarkat
+token-määrät (esim. max_length = promptin tokenit + N).
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+
+class TokenizerService:
+    """Muistava enkooderi yhden tokenizerin päällä (thread-safe)"""
+
+    def __init__(self, tokenizer, max_entries: Optional[int] = None):
+        if max_entries is None:
+            max_entries = int(os.getenv('TOKENIZER_CACHE_ENTRIES', '4096'))
+        self.tokenizer = tokenizer
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[str, Tuple[int, ...]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def encode(self, text: str) -> Tuple[int, ...]:
+        """Token-id:t (erikoistokenit mukana kuten tokenizer(text)); tulos on muuttumaton"""
+        return self.encode_batch([text])[0]
+
+    def encode_batch(self, texts: List[str]) -> List[Tuple[int, ...]]:
+        """Enkoodaa listan: muistissa olevat haetaan, loput yhdellä batch-kutsulla"""
+        results: List[Optional[Tuple[int, ...]]] = [None] * len(texts)
+        missing: Dict[str, List[int]] = {}
+        with self._lock:
+            for index, text in enumerate(texts):
+                ids = self._cache.get(text)
+                if ids is None:
+                    missing.setdefault(text, []).append(index)
+                else:
+                    self._cache.move_to_end(text)
+                    self.hits += 1
+                    results[index] = ids
+
+        if missing:
+            unique = list(missing)
+            encoded = self.tokenizer(unique)['input_ids']
+            with self._lock:
+                self.misses += len(unique)
+                for text, ids in zip(unique, encoded):
+                    ids = tuple(ids)
+                    for index in missing[text]:
+                        results[index] = ids
+                    self._cache[text] = ids
+                    self._cache.move_to_end(text)
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+
+        return results
+
+    def count(self, text: str) -> int:
+        """Tarkka token-määrä"""
+        return len(self.encode(text))
+
+    def count_batch(self, texts: List[str]) -> List[int]:
+        return [len(ids) for ids in self.encode_batch(texts)]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': len(self._cache),
+        }
+
+
+_services: Dict[str, TokenizerService] = {}
+_services_lock = threading.Lock()
+
+
+def get_tokenizer_service(model_name: str = "gpt2") -> TokenizerService:
+    """Prosessin jaettu palvelu mallille; fast-tokenizer ladataan vain kerran"""
+    with _services_lock:
+        service = _services.get(model_name)
+        if service is None:
+            from transformers import AutoTokenizer
+            tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=True)
+            service = _services[model_name] = TokenizerService(tokenizer)
+        return service
+
+
+def count_tokens(text: str, model_name: str = "gpt2") -> int:
+    """Tarkka token-määrä mallin tokenizerilla"""
+    return get_tokenizer_service(model_name).count(text)
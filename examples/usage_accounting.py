@@ -0,0 +1,126 @@
+"""
+Usage Accounting - token- ja kustannuskirjanpito koeajoille
+Jokainen kutsu kirjataan (kategoria, malli, prompt- ja completion-tokenit),
+hinta lasketaan hintataulukosta ja ajo pysäytetään ennen kuin
+budjetti (RUN_BUDGET_USD) ylittyisi.
+
+Hinnat ovat USD / 1M tokenia (input, output). Paikalliset mallit ovat
+ilmaisia. PRICE_TABLE_PATH (JSON) voi ylikirjoittaa tai lisätä hintoja.
+"""
+
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# USD / 1M tokenia: (prompt, completion)
+PRICE_TABLE = {
+    'gpt-3.5-turbo': (0.50, 1.50),
+    'gpt-4': (30.00, 60.00),
+    'gpt-4-turbo': (10.00, 30.00),
+    'gpt-4o': (2.50, 10.00),
+    'gpt-4o-mini': (0.15, 0.60),
+}
+LOCAL_PRICE = (0.0, 0.0)
+
+
+class BudgetExceeded(RuntimeError):
+    """Seuraava kutsu ylittäisi ajon budjetin"""
+
+
+def load_price_table(path: Optional[str] = None) -> Dict[str, tuple]:
+    """Oletushinnat + PRICE_TABLE_PATH-tiedoston hinnat ({"malli": [input, output]})"""
+    table = dict(PRICE_TABLE)
+    path = path or os.getenv('PRICE_TABLE_PATH')
+    if path and os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            table.update({model: tuple(prices) for model, prices in json.load(f).items()})
+    return table
+
+
+def default_budget() -> Optional[float]:
+    """RUN_BUDGET_USD ympäristöstä (tyhjä = ei rajaa)"""
+    value = os.getenv('RUN_BUDGET_USD')
+    return float(value) if value else None
+
+
+class UsageTracker:
+    """Kirjaa token-käytön ja kustannukset per kategoria ja malli"""
+
+    def __init__(self, budget_usd: Optional[float] = None, prices: Optional[Dict[str, tuple]] = None):
+        self.budget_usd = budget_usd if budget_usd is not None else default_budget()
+        self.prices = prices or load_price_table()
+        self.totals = {}  # (kategoria, malli) -> {'calls', 'prompt_tokens', 'completion_tokens', 'cost_usd'}
+        self.spent_usd = 0.0
+        self.reserved_usd = 0.0  # Käynnissä olevien kutsujen pahimman tapauksen hinta
+        self._lock = threading.Lock()
+
+    def price(self, model: str) -> tuple:
+        """Hinta mallille ('openai:gpt-4o' -> gpt-4o; tuntematon/paikallinen = 0)"""
+        name = model.split(':', 1)[1] if model.startswith('openai:') else model
+        if name in self.prices:
+            return self.prices[name]
+        # Päivätyt versiot (gpt-4o-mini-2024-07-18) pisimmän tunnetun etuliitteen mukaan
+        matches = [known for known in self.prices if name.startswith(known)]
+        return self.prices[max(matches, key=len)] if matches else LOCAL_PRICE
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        prompt_price, completion_price = self.price(model)
+        return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+    def reserve(self, calls: Sequence[Tuple[str, int, int]]) -> List[float]:
+        """Varaa pahimman tapauksen hinnan kutsuille [(malli, prompt_tokens, max_completion_tokens)].
+
+        Kaikkien kutsujen (kaikki mallit) summa tarkistetaan kerralla käytetyn ja
+        jo varatun kanssa; ylitys nostaa BudgetExceeded eikä varaa mitään.
+        Palauttaa kutsukohtaiset arviot, jotka record()/release() vapauttaa.
+        """
+        estimates = [self.cost(model, prompt_tokens, max_tokens) for model, prompt_tokens, max_tokens in calls]
+        total = sum(estimates)
+        with self._lock:
+            if self.budget_usd is not None and self.spent_usd + self.reserved_usd + total > self.budget_usd:
+                models = ', '.join(sorted({model for model, _, _ in calls}))
+                raise BudgetExceeded(
+                    f"Budjetti ${self.budget_usd:.4f} ylittyisi: käytetty ${self.spent_usd:.4f} "
+                    f"+ varattu ${self.reserved_usd:.4f} + arvio ${total:.4f} ({models})"
+                )
+            self.reserved_usd += total
+        return estimates
+
+    def release(self, reserved_usd: float):
+        """Vapauttaa varauksen (epäonnistunut kutsu)"""
+        with self._lock:
+            self.reserved_usd = max(0.0, self.reserved_usd - reserved_usd)
+
+    def record(self, category: str, model: str, prompt_tokens: int, completion_tokens: int,
+               reserved_usd: float = 0.0) -> float:
+        """Kirjaa toteutuneen käytön ja vapauttaa kutsun varauksen; palauttaa kutsun hinnan"""
+        cost = self.cost(model, prompt_tokens, completion_tokens)
+        with self._lock:
+            self.reserved_usd = max(0.0, self.reserved_usd - reserved_usd)
+            totals = self.totals.setdefault((category, model), {
+                'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'cost_usd': 0.0
+            })
+            totals['calls'] += 1
+            totals['prompt_tokens'] += prompt_tokens
+            totals['completion_tokens'] += completion_tokens
+            totals['cost_usd'] += cost
+            self.spent_usd += cost
+        return cost
+
+    def by_category(self) -> Dict[str, Dict[str, Any]]:
+        """Summat kategorioittain (kaikki mallit yhteen)"""
+        result = {}
+        for (category, _), totals in self.totals.items():
+            summary = result.setdefault(category, {'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'cost_usd': 0.0})
+            for key, value in totals.items():
+                summary[key] += value
+        return result
+
+    def print_summary(self):
+        print("\n💰 === TOKENIT JA KUSTANNUKSET ===")
+        for category, totals in self.by_category().items():
+            print(f"   • {category}: {totals['calls']} kutsua, {totals['prompt_tokens']} + "
+                  f"{totals['completion_tokens']} tokenia, ${totals['cost_usd']:.4f}")
+        budget = f" / budjetti ${self.budget_usd:.4f}" if self.budget_usd is not None else ""
+        print(f"   Yhteensä ${self.spent_usd:.4f}{budget}")
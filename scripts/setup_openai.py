@@ -4,8 +4,13 @@ Testaa OpenAI API:n toimivuuden ja auttaa konfiguroinnissa.
 """
 
 import os
+import sys
 from dotenv import load_dotenv
 
+# Hintataulukko ja kirjanpito: examples/usage_accounting.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'examples'))
+from usage_accounting import UsageTracker, load_price_table
+
 def check_openai_setup():
     """Tarkistaa OpenAI API:n konfiguraation ja testaa yhteyden."""
     
@@ -57,7 +62,12 @@ def check_openai_setup():
         
         result = response.choices[0].message.content.strip()
         print(f"✅ API toimii! Vastaus: {result}")
-        print(f"💰 Käytetty tokeneita: {response.usage.total_tokens}")
+        
+        usage = UsageTracker()
+        cost = usage.record('setup-check', response.model,
+                            response.usage.prompt_tokens, response.usage.completion_tokens)
+        print(f"💰 Käytetty tokeneita: {response.usage.prompt_tokens} + "
+              f"{response.usage.completion_tokens} (~${cost:.6f})")
         
         return True
         
@@ -73,9 +83,12 @@ def check_openai_setup():
 
 def show_usage_info():
     """Näyttää OpenAI API:n käytön tietoja."""
-    print("\n💡 OPENAI API TIETOJA:")
-    print("- gpt-3.5-turbo: ~$0.002/1000 tokenia")
-    print("- gpt-4: ~$0.03/1000 tokenia") 
+    print("\n💡 OPENAI API TIETOJA (hintataulukko, USD / 1M tokenia):")
+    for model, (prompt_price, completion_price) in load_price_table().items():
+        print(f"- {model}: ${prompt_price:.2f} input / ${completion_price:.2f} output")
+    budget = os.getenv('RUN_BUDGET_USD')
+    if budget:
+        print(f"- Ajon budjetti (RUN_BUDGET_USD): ${float(budget):.2f}")
     print("- Uusille tileille usein $5 ilmaista krediittiä")
     print("- Seuraa kulutusta: https://platform.openai.com/usage")
 
@@ -0,0 +1,6 @@
+"""Testit ajetaan repon juuresta: examples/-moduulit importataan kuten skripteissä."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'examples'))
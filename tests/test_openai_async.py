@@ -0,0 +1,139 @@
+"""openai_async mock-palvelinta vastaan: rinnakkaisuusraja, uusinnat, usage ja yhteyspooli."""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("httpx")
+
+import openai_async  # noqa: E402
+from mock_openai_server import serve_in_thread  # noqa: E402
+from openai_async import AsyncOpenAIProvider  # noqa: E402
+
+CONCURRENCY = 4
+
+
+@pytest.fixture
+def mock_server():
+    servers = []
+
+    def start(fail_rate=0.0, latency=0.0):
+        server, state, base_url = serve_in_thread(fail_rate=fail_rate, latency=latency)
+        servers.append(server)
+        return state, base_url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def fast_retries(monkeypatch):
+    # Uusinnat ilman backoff-odotusta (Retry-After / eksponentiaalinen viive)
+    monkeypatch.setattr(openai_async, 'retry_delay', lambda attempt, **kwargs: 0.0)
+
+
+def complete_all(base_url, prompts, **params):
+    """Ajaa promptit yhdellä providerilla; palauttaa (tulokset, stats)"""
+    async def run():
+        async with AsyncOpenAIProvider(api_key="mock-key", base_url=base_url, model="mock",
+                                       max_concurrency=CONCURRENCY, requests_per_minute=60000) as provider:
+            results = await provider.complete_many(prompts, max_tokens=8, **params)
+            return results, dict(provider.stats)
+
+    return asyncio.run(run())
+
+
+def test_peak_concurrency_within_limit(mock_server):
+    state, base_url = mock_server(latency=0.05)
+    results, _ = complete_all(base_url, [f"Prompt {i}" for i in range(20)])
+
+    assert not [r for r in results if isinstance(r, Exception)]
+    assert state.requests == 20
+    assert 1 < state.peak_active <= CONCURRENCY
+
+
+def test_retries_on_429_and_503(mock_server, fast_retries):
+    state, base_url = mock_server(fail_rate=0.3)
+    results, stats = complete_all(base_url, [f"Prompt {i}" for i in range(30)])
+
+    assert not [r for r in results if isinstance(r, Exception)]
+    assert state.failures > 0
+    assert stats['retries'] == state.failures
+    assert stats['requests'] == 30
+    assert state.requests == 30 + state.failures
+
+
+def test_gives_up_after_max_retries(mock_server, fast_retries):
+    state, base_url = mock_server(fail_rate=1.0)
+
+    async def run():
+        async with AsyncOpenAIProvider(api_key="mock-key", base_url=base_url, max_retries=2) as provider:
+            with pytest.raises(Exception):
+                await provider.complete("Always fails", max_tokens=4)
+            return dict(provider.stats)
+
+    stats = asyncio.run(run())
+    assert state.requests == 3
+    assert stats['failures'] == 1 and stats['retries'] == 2
+
+
+def test_usage_is_aggregated(mock_server):
+    _, base_url = mock_server()
+    prompts = [f"Count these words number {i}" for i in range(10)]
+    results, stats = complete_all(base_url, prompts)
+
+    for prompt, result in zip(prompts, results):
+        assert result['prompt_tokens'] == len(prompt.split())
+        assert result['completion_tokens'] > 0
+    assert stats['prompt_tokens'] == sum(r['prompt_tokens'] for r in results)
+    assert stats['completion_tokens'] == sum(r['completion_tokens'] for r in results)
+
+
+def test_stream_reports_usage(mock_server):
+    _, base_url = mock_server()
+
+    async def run():
+        usage = {}
+        async with AsyncOpenAIProvider(api_key="mock-key", base_url=base_url) as provider:
+            pieces = [piece async for piece in provider.stream("Stream this prompt", max_tokens=8, usage=usage)]
+            return ''.join(pieces), usage, dict(provider.stats)
+
+    text, usage, stats = asyncio.run(run())
+    assert text.startswith("Mock reply to:")
+    assert usage == {'prompt_tokens': 3, 'completion_tokens': len(text.split())}
+    assert stats['prompt_tokens'] == 3
+
+
+def test_connections_are_reused(mock_server):
+    state, base_url = mock_server(latency=0.01)
+    results, _ = complete_all(base_url, [f"Prompt {i}" for i in range(40)])
+
+    assert not [r for r in results if isinstance(r, Exception)]
+    # Keep-alive -pooli: yhteyksiä korkeintaan rinnakkaisuusrajan verran, ei yksi per pyyntö
+    assert len(state.connections) <= CONCURRENCY
+
+
+def test_provider_reuses_client_across_calls(mock_server):
+    from providers import OpenAIProvider
+
+    state, base_url = mock_server()
+    provider = OpenAIProvider("mock", api_key="mock-key", base_url=base_url, max_concurrency=CONCURRENCY)
+    try:
+        for _ in range(3):
+            results = provider.generate_batch([{'prompt': f"Prompt {i}", 'max_new_tokens': 8} for i in range(8)])
+            assert not [r for r in results if r['text'].startswith('Error:')]
+        # Kesken jätetty stream suljetaan eikä jää varaamaan yhteyttä
+        pieces = provider.stream({'prompt': "Stream this prompt", 'max_new_tokens': 8})
+        next(pieces)
+        pieces.close()
+        metrics = {}
+        assert ''.join(provider.stream({'prompt': "Stream again", 'max_new_tokens': 8}, metrics))
+        assert metrics['prompt_tokens'] == 2
+    finally:
+        provider.close()
+
+    # Yksi pooli koko providerille: yhteyksiä rinnakkaisuusrajan verran, ei per kutsu
+    assert len(state.connections) <= CONCURRENCY
@@ -0,0 +1,53 @@
+"""SeededSampler vs do_sample-polku: samat sallitut tokenit (temperature, top-k, top-p)."""
+
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+from transformers import (LogitsProcessorList, TemperatureLogitsWarper,  # noqa: E402
+                          TopKLogitsWarper, TopPLogitsWarper)
+
+from hf_generation import DEFAULT_TOP_K, SeededSampler  # noqa: E402
+
+VOCAB = 1000
+
+
+def unseeded_support(scores, temperature, top_p):
+    """Tokenit jotka generate(do_sample=True) voi valita (sama warper-ketju kuin transformersissa)"""
+    warpers = LogitsProcessorList([TemperatureLogitsWarper(temperature), TopKLogitsWarper(DEFAULT_TOP_K)])
+    if top_p is not None:
+        warpers.append(TopPLogitsWarper(top_p))
+    return torch.isfinite(warpers(None, scores.clone()))
+
+
+def seeded_support(scores, temperature, top_p, seeds):
+    return torch.isfinite(SeededSampler(temperature, top_p, seeds)(None, scores.clone()))
+
+
+@pytest.mark.parametrize("temperature,top_p", [(0.7, None), (1.0, 0.9), (0.2, 0.5), (1.5, 0.95)])
+def test_support_matches_do_sample(temperature, top_p):
+    torch.manual_seed(0)
+    scores = torch.randn(4, VOCAB) * 3
+    seeds = [1, 2, 3, 4]
+
+    expected = unseeded_support(scores, temperature, top_p)
+    assert torch.equal(seeded_support(scores, temperature, top_p, seeds), expected)
+    assert int(expected.sum(dim=-1).max()) <= DEFAULT_TOP_K
+
+
+def test_samples_stay_in_support():
+    torch.manual_seed(1)
+    scores = torch.randn(1, VOCAB) * 2
+    support = unseeded_support(scores, 1.0, 0.9)[0]
+
+    picks = {int(SeededSampler(1.0, 0.9, [seed])(None, scores.clone()).argmax()) for seed in range(300)}
+    assert all(support[token] for token in picks)
+    assert len(picks) > 1  # Sampling, ei greedy
+
+
+def test_same_seed_same_token():
+    scores = torch.randn(2, VOCAB)
+    first = SeededSampler(0.8, None, [7, 8])(None, scores.clone()).argmax(dim=-1)
+    second = SeededSampler(0.8, None, [7, 8])(None, scores.clone()).argmax(dim=-1)
+    assert torch.equal(first, second)
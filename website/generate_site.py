@@ -5,157 +5,409 @@ Generoi automaattisesti HTML-sivuston harjoitukset/ kansiosta ja lokeista.
 
 import os
 import re
+import sys
 import json
+import time
+import select
+import struct
+import hashlib
+import argparse
+import ctypes
+import ctypes.util
+from concurrent.futures import ThreadPoolExecutor
+
+from site_templates import Markup, get_template, templates_fingerprint
+from log_pages import build_log_pages, total_rows
 from datetime import datetime
 from pathlib import Path
 
-def parse_day_file(file_path):
-    """Parsii day*.txt tiedoston ja palauttaa strukturoitua dataa."""
-    
-    with open(file_path, 'r', encoding='utf-8') as f:
-        content = f.read()
+# Nosta kun generate_day_page muuttuu; templates/*.html muutokset huomataan hashista
+TEMPLATE_VERSION = "2"
+MANIFEST_NAME = ".build_manifest.json"
+
+# Otsikkokentät: (avain, merkki, oletus); esikäännetyt kuviot, haetaan vain riveiltä joilla merkki on
+HEADER_FIELDS = [
+    ('date', '📅 PÄIVÄMÄÄRÄ: ', "Ei määritelty"),
+    ('duration', '⏱️ KESTO: ', "Ei määritelty"),
+    ('target', '🎯 TAVOITE: ', "Ei määritelty"),
+    ('success', '🏆 ONNISTUMINEN: ', "0%"),
+]
+HEADER_PATTERNS = {key: re.compile(re.escape(marker) + r'(.+)') for key, marker, _ in HEADER_FIELDS}
+DAY_FILE_PATTERN = re.compile(r'day(\d+)\.txt')
+LEARNED_MARKER = 'OPITUT ASIAT'
+SECTION_END = '=' * 50
+COMPLETED_MARK = '✅'
+PENDING_MARK = '⏸️'
+
+def read_source(file_path):
+    """Lukee lähdetiedoston kerran: palauttaa (teksti, SHA-256 tavuista)."""
+    with open(file_path, 'rb') as f:
+        raw = f.read()
+    # Sama rivinvaihtojen käsittely kuin tekstitilassa avattaessa
+    content = raw.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+    return content, hashlib.sha256(raw).hexdigest()
+
+def parse_day_content(content, file_path=None):
+    """Parsii day*.txt sisällön yhdellä rivikohtaisella läpikäynnillä."""
     
-    # Etsi päivämäärä
-    date_match = re.search(r'📅 PÄIVÄMÄÄRÄ: (.+)', content)
-    date = date_match.group(1) if date_match else "Ei määritelty"
+    data = {key: None for key, _, _ in HEADER_FIELDS}
+    pending_fields = list(HEADER_FIELDS)
+    completed_tasks = pending_tasks = 0
     
-    # Etsi kesto  
-    duration_match = re.search(r'⏱️ KESTO: (.+)', content)
-    duration = duration_match.group(1) if duration_match else "Ei määritelty"
+    # Opitut asiat: OPITUT ASIAT -> ensimmäiseen 50+ '='-merkin jonoon asti
+    learned_section = ""
+    learned_parts = None
     
-    # Etsi tavoite
-    target_match = re.search(r'🎯 TAVOITE: (.+)', content)
-    target = target_match.group(1) if target_match else "Ei määritelty"
+    for line in content.split('\n'):
+        completed_tasks += line.count(COMPLETED_MARK)
+        pending_tasks += line.count(PENDING_MARK)
+        
+        if pending_fields:
+            for field in list(pending_fields):
+                key, marker, _ = field
+                if marker in line:
+                    match = HEADER_PATTERNS[key].search(line)
+                    if match:
+                        data[key] = match.group(1)
+                        pending_fields.remove(field)
+        
+        if learned_section or (learned_parts is None and LEARNED_MARKER not in line):
+            continue
+        if learned_parts is None:
+            begin = line.index(LEARNED_MARKER)
+            search_from = begin + len(LEARNED_MARKER)
+            learned_parts = []
+        else:
+            begin = search_from = 0
+        end = line.find(SECTION_END, search_from)
+        if end >= 0:
+            learned_section = '\n'.join(learned_parts + [line[begin:end]])
+        else:
+            learned_parts.append(line[begin:])
     
-    # Etsi onnistumisprosentti
-    success_match = re.search(r'🏆 ONNISTUMINEN: (.+)', content)
-    success = success_match.group(1) if success_match else "0%"
+    for key, _, default in HEADER_FIELDS:
+        if data[key] is None:
+            data[key] = default
     
-    # Etsi opitut asiat sektion
-    learned_section = ""
-    learned_match = re.search(r'OPITUT ASIAT.*?(?=={50,})', content, re.DOTALL)
-    if learned_match:
-        learned_section = learned_match.group(0)
-    
-    # Laske tehtäviä (✅ merkkien määrä)
-    completed_tasks = len(re.findall(r'✅', content))
-    pending_tasks = len(re.findall(r'⏸️', content))
-    
-    return {
-        'date': date,
-        'duration': duration, 
-        'target': target,
-        'success': success,
+    data.update({
         'completed_tasks': completed_tasks,
         'pending_tasks': pending_tasks,
         'learned_section': learned_section,
-        'file_path': file_path
-    }
+        'file_path': file_path,
+        'content': content,
+    })
+    return data
+
+def parse_day_file(file_path):
+    """Parsii day*.txt tiedoston ja palauttaa strukturoitua dataa (sisältö mukana, 'content')."""
+    content, _ = read_source(file_path)
+    return parse_day_content(content, file_path)
 
 def generate_day_page(day_num, day_data):
-    """Generoi yksittäisen päivän HTML-sivun."""
-    
-    html = f"""
-<!DOCTYPE html>
-<html lang="fi">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>DAY {day_num:02d} — Oppimispäiväkirja</title>
-    <link rel="stylesheet" href="../styles.css">
-</head>
-<body>
-    <nav>
-        <div class="container">
-            <a href="../index.html">← Takaisin etusivulle</a>
-        </div>
-    </nav>
-    
-    <header>
-        <div class="container">
-            <h1>DAY {day_num:02d}</h1>
-            <p class="subtitle">{day_data['target']}</p>
-            <div class="day-meta">
-                <span>📅 {day_data['date']}</span>
-                <span>⏱️ {day_data['duration']}</span>  
-                <span>🏆 {day_data['success']}</span>
-            </div>
-        </div>
-    </header>
-    
-    <div class="container">
-        <div class="content">
-            <!-- Tässä olisi koko day*.txt sisältö formatoituna -->
-            <div class="raw-content">
-                <pre>{open(day_data['file_path'], 'r', encoding='utf-8').read()}</pre>
-            </div>
-        </div>
-    </div>
-</body>
-</html>
-"""
-    return html
+    """Generoi yksittäisen päivän HTML-sivun (templates/day.html, sisältö escapetaan)."""
+    return get_template("day.html").render(
+        day_num=f"{day_num:02d}",
+        target=day_data['target'],
+        date=day_data['date'],
+        duration=day_data['duration'],
+        success=day_data['success'],
+        content=day_data['content'],
+    )
+
+def day_status(day_data):
+    """Kortin tila onnistumisprosentista: (css-luokka, teksti)."""
+    if "100%" in day_data['success']:
+        return 'complete', "✅ Valmis"
+    if day_data['success'].startswith("0%"):
+        return 'pending', "📋 Suunnittelu"
+    return 'progress', "🔄 Kesken"
+
+def generate_index(days_data, prompt_tests=0):
+    """Generoi index.html:n koostetusta days_datasta (kortit + tilastot)."""
+    card = get_template("day_card.html")
+    cards = []
+    for day_num, day_data in sorted(days_data.items()):
+        status, status_label = day_status(day_data)
+        cards.append(card.render(
+            day_num=f"{day_num:02d}",
+            status=status,
+            status_label=status_label,
+            target=day_data['target'].strip(),
+            duration=day_data['duration'].strip(),
+            success=day_data['success'].strip(),
+            completed_tasks=day_data['completed_tasks'],
+        ))
+    
+    return get_template("index.html").render(
+        completed_days=sum(1 for d in days_data.values() if "100%" in d['success']),
+        total_days=len(days_data),
+        completed_tasks=sum(d['completed_tasks'] for d in days_data.values()),
+        pending_tasks=sum(d['pending_tasks'] for d in days_data.values()),
+        prompt_tests=prompt_tests,
+        day_cards=Markup(''.join(cards)),
+    )
+
+def template_version():
+    """Manifestin template-versio: TEMPLATE_VERSION + templatetiedostojen hash."""
+    return f"{TEMPLATE_VERSION}-{templates_fingerprint()}"
+
+def load_manifest(path, version):
+    """Lukee edellisen buildin manifestin (tyhjä, jos puuttuu tai template-versio vaihtui)."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {'template_version': version, 'pages': {}}
+    if manifest.get('template_version') != version:
+        return {'template_version': version, 'pages': {}}
+    return manifest
+
+def save_manifest(path, manifest):
+    """Tallentaa manifestin (väliaikaistiedosto + replace)."""
+    tmp_path = Path(str(path) + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def write_if_changed(path, content):
+    """Kirjoittaa tiedoston atomisesti vain, jos tavut muuttuivat. Palauttaa True jos kirjoitettiin."""
+    data = content.encode('utf-8')
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    except OSError:
+        pass
+    # Väliaikaistiedosto + replace: selain tai watch ei koskaan näe puolikasta sivua
+    tmp_path = Path(str(path) + ".tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return True
+
+def default_workers():
+    """Renderöintisäikeiden määrä (SITE_BUILD_WORKERS, oletus ytimet, max 8)."""
+    return int(os.getenv('SITE_BUILD_WORKERS', '0')) or min(8, os.cpu_count() or 1)
+
+def discover_sources(harjoitukset_dir=Path("harjoitukset")):
+    """Etsii day*.txt lähteet kerran: {päivänumero: polku}."""
+    sources = {}
+    for day_file in sorted(harjoitukset_dir.glob("day*.txt")):
+        day_match = DAY_FILE_PATTERN.search(day_file.name)
+        if day_match:
+            sources[int(day_match.group(1))] = day_file
+    return sources
 
-def update_website():
-    """Päivittää koko verkkosivuston harjoitukset/ kansiosta."""
+def build_day(day_num, day_file, days_dir, entry):
+    """Yhden päivän sivu (ajetaan workerissa). Palauttaa (tila, day_data, manifest-rivi)."""
+    day_page_path = days_dir / f"day{day_num:02d}.html"
+    # Yksi luku: sama sisältö hashiin ja parseriin
+    content, source_hash = read_source(day_file)
+    
+    if entry and entry['source_hash'] == source_hash and day_page_path.exists():
+        # Lähde ja template ennallaan: parsittu data manifestista, ei renderöintiä
+        return 'skipped', dict(entry['data'], file_path=str(day_file)), entry
+    
+    # Parsii päivän data ja generoi sivun
+    day_data = parse_day_content(content, day_file)
+    day_html = generate_day_page(day_num, day_data)
+    status = 'rebuilt' if write_if_changed(day_page_path, day_html) else 'unchanged'
+    
+    return status, day_data, {
+        'source': day_file.as_posix(),
+        'source_hash': source_hash,
+        'data': {key: value for key, value in day_data.items() if key not in ('file_path', 'content')},
+    }
+
+def update_website(incremental=True, sources=None, changed=None, workers=None):
+    """Päivittää verkkosivuston harjoitukset/ kansiosta.
+    
+    Inkrementaalisesti generoidaan vain sivut, joiden lähdetiedosto tai
+    template-versio muuttui (manifest: website/.build_manifest.json).
+    sources on discover_sources()-tulos; changed rajaa luettavat lähteet
+    (watch), muiden päivien tiedot otetaan manifestista. Sivut renderöidään
+    säiepoolissa.
+    """
     
     print("🔄 Päivitetään oppimispäiväkirja verkkosivusto...")
+    start = time.perf_counter()
     
-    harjoitukset_dir = Path("harjoitukset")
     website_dir = Path("website") 
     days_dir = website_dir / "days"
+    manifest_path = website_dir / MANIFEST_NAME
     
     # Luo days-kansio
     days_dir.mkdir(exist_ok=True)
     
-    # Käy läpi kaikki day*.txt tiedostot
-    day_files = sorted(harjoitukset_dir.glob("day*.txt"))
+    if sources is None:
+        sources = discover_sources()
+    version = template_version()
+    previous = load_manifest(manifest_path, version) if incremental else {'pages': {}}
+    manifest = {'template_version': version, 'pages': {}}
+    counts = {'rebuilt': 0, 'unchanged': 0, 'skipped': 0}
     days_data = {}
     
-    for day_file in day_files:
-        # Etsi päivänumero
-        day_match = re.search(r'day(\d+)\.txt', day_file.name)
-        if day_match:
-            day_num = int(day_match.group(1))
-            print(f"  📄 Käsitellään {day_file.name}...")
-            
-            # Parsii päivän data
-            day_data = parse_day_file(day_file)
+    targets = {}
+    for day_num, day_file in sources.items():
+        page_key = f"days/day{day_num:02d}.html"
+        entry = previous['pages'].get(page_key)
+        if changed is not None and day_num not in changed and entry and (website_dir / page_key).exists():
+            # Koskematon päivä (watch): ei lueta lähdettä
+            days_data[day_num] = dict(entry['data'], file_path=str(day_file))
+            manifest['pages'][page_key] = entry
+            counts['skipped'] += 1
+        else:
+            targets[day_num] = (day_file, entry)
+    
+    with ThreadPoolExecutor(max_workers=workers or default_workers()) as executor:
+        futures = {
+            day_num: executor.submit(build_day, day_num, day_file, days_dir, entry)
+            for day_num, (day_file, entry) in targets.items()
+        }
+        for day_num, future in futures.items():
+            status, day_data, entry = future.result()
             days_data[day_num] = day_data
-            
-            # Generoi päivän sivu
-            day_html = generate_day_page(day_num, day_data)
-            day_page_path = days_dir / f"day{day_num:02d}.html"
-            
-            with open(day_page_path, 'w', encoding='utf-8') as f:
-                f.write(day_html)
-            
-            print(f"    ✅ Luotu {day_page_path}")
-    
-    # Päivitä tilastot index.html:ään
+            manifest['pages'][f"days/day{day_num:02d}.html"] = entry
+            counts[status] += 1
+            if status == 'rebuilt':
+                print(f"    ✅ Luotu {days_dir / f'day{day_num:02d}.html'}")
+            elif status == 'unchanged':
+                print(f"    ➖ {days_dir / f'day{day_num:02d}.html'} ennallaan")
+    
+    # Poistetun lähteen sivu poistetaan
+    for page_key in set(previous['pages']) - set(manifest['pages']):
+        stale_path = website_dir / page_key
+        if stale_path.exists():
+            stale_path.unlink()
+            print(f"  🗑️  Poistettu {stale_path}")
+    
+    save_manifest(manifest_path, manifest)
+    
+    # Koelokien yhteenvedot (välimuistissa lokin koon ja mtimen mukaan)
+    log_summary = build_log_pages(website_dir, write_if_changed)
+    
+    # Päivitä kortit ja tilastot index.html:ään
+    if write_if_changed(website_dir / "index.html", generate_index(days_data, total_rows(log_summary))):
+        print(f"    ✅ Päivitetty {website_dir / 'index.html'}")
     total_days = len(days_data)
     completed_days = sum(1 for d in days_data.values() if "100%" in d['success'])
     
+    elapsed = time.perf_counter() - start
+    print(f"♻️  {counts['rebuilt']} sivua generoitu, {counts['unchanged']} ennallaan, "
+          f"{counts['skipped']} ohitettu ({elapsed * 1000:.1f} ms)")
     print(f"📊 Päivitetty sivusto: {completed_days}/{total_days} päivää valmis")
     print(f"🌐 Avaa: website/index.html")
+    return days_data
 
-def generate_navigation():
+def generate_navigation(sources=None):
     """Luo navigaation kaikille päiville."""
-    nav_html = ""
+    if sources is None:
+        sources = discover_sources()
+    return ''.join(f'<a href="days/day{day_num:02d}.html">DAY {day_num:02d}</a>\n' for day_num in sources)
+
+# inotify (Linux): tiedosto kirjoitettu, siirretty hakemistoon/pois, luotu tai poistettu
+IN_CLOSE_WRITE, IN_MOVED_FROM, IN_MOVED_TO, IN_CREATE, IN_DELETE = 0x8, 0x40, 0x80, 0x100, 0x200
+INOTIFY_EVENT = struct.Struct('iIII')
+
+def inotify_changes(directory, debounce=0.02):
+    """Generaattori muuttuneiden tiedostonimien joukoista (inotify ctypesillä).
+    
+    Nostaa OSError, jos inotify ei ole käytettävissä.
+    """
+    libc_name = ctypes.util.find_library('c')
+    if sys.platform != 'linux' or not libc_name:
+        raise OSError("inotify vaatii Linuxin")
+    libc = ctypes.CDLL(libc_name, use_errno=True)
+    fd = libc.inotify_init1(os.O_CLOEXEC)
+    if fd < 0:
+        raise OSError(ctypes.get_errno(), "inotify_init1 epäonnistui")
+    mask = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    if libc.inotify_add_watch(fd, os.fsencode(str(directory)), mask) < 0:
+        os.close(fd)
+        raise OSError(ctypes.get_errno(), f"inotify_add_watch {directory} epäonnistui")
+    
+    try:
+        while True:
+            select.select([fd], [], [])
+            names = set()
+            # Editorin tallennus on useita tapahtumia: kerätään hetken purske yhdeksi buildiksi
+            while select.select([fd], [], [], debounce)[0]:
+                data = os.read(fd, 64 * 1024)
+                offset = 0
+                while offset < len(data):
+                    _, _, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+                    offset += INOTIFY_EVENT.size
+                    names.add(os.fsdecode(data[offset:offset + length].rstrip(b'\0')))
+                    offset += length
+            yield names
+    finally:
+        os.close(fd)
+
+def polling_changes(directory, interval=0.2):
+    """Varakeino ilman inotifya: vertaa (mtime, koko) -tilaa interval välein."""
+    def snapshot():
+        state = {}
+        for entry in os.scandir(directory):
+            stat = entry.stat()
+            state[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        return state
+    
+    previous = snapshot()
+    while True:
+        time.sleep(interval)
+        current = snapshot()
+        names = {name for name in previous.keys() | current.keys() if previous.get(name) != current.get(name)}
+        previous = current
+        if names:
+            yield names
+
+def watch(interval=0.2, workers=None):
+    """Rakentaa sivuston ja generoi sen jälkeen vain tallennetun päivän sivun ja indexin."""
     harjoitukset_dir = Path("harjoitukset")
-    day_files = sorted(harjoitukset_dir.glob("day*.txt"))
+    sources = discover_sources(harjoitukset_dir)
+    update_website(sources=sources, workers=workers)
     
-    for day_file in day_files:
-        day_match = re.search(r'day(\d+)\.txt', day_file.name)
-        if day_match:
-            day_num = int(day_match.group(1))
-            nav_html += f'<a href="days/day{day_num:02d}.html">DAY {day_num:02d}</a>\n'
+    try:
+        changes = inotify_changes(harjoitukset_dir)
+        print(f"\n👀 Seurataan {harjoitukset_dir}/ (inotify) - Ctrl+C lopettaa")
+    except OSError as e:
+        changes = polling_changes(harjoitukset_dir, interval)
+        print(f"\n👀 Seurataan {harjoitukset_dir}/ (pollaus {interval}s, {e}) - Ctrl+C lopettaa")
     
-    return nav_html
+    try:
+        for names in changes:
+            changed = set()
+            for name in names:
+                day_match = DAY_FILE_PATTERN.fullmatch(name)
+                if not day_match:
+                    continue
+                day_num = int(day_match.group(1))
+                changed.add(day_num)
+                # Lähdelista päivitetään tapahtumista, ei uutta globia
+                if (harjoitukset_dir / name).exists():
+                    sources[day_num] = harjoitukset_dir / name
+                else:
+                    sources.pop(day_num, None)
+            if changed:
+                sources = dict(sorted(sources.items()))
+                print(f"\n✏️  Muuttui: {', '.join(sorted(names))}")
+                update_website(sources=sources, changed=changed, workers=workers)
+    except KeyboardInterrupt:
+        print("\n👋 Seuranta lopetettu")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Oppimispäiväkirjan sivustogeneraattori")
+    parser.add_argument('--full', action='store_true', help="generoi kaikki sivut manifestista välittämättä")
+    parser.add_argument('--watch', action='store_true', help="generoi muuttuneet päivät tallennettaessa")
+    parser.add_argument('--workers', type=int, default=None, help="renderöintisäikeet (oletus SITE_BUILD_WORKERS)")
+    parser.add_argument('--interval', type=float, default=0.2, help="pollausväli ilman inotifya (s)")
+    args = parser.parse_args()
+    
     # Vaihda työhakemisto oikeaan paikkaan
     os.chdir(Path(__file__).parent.parent)
-    update_website()
-    print("\n🎉 Verkkosivusto päivitetty onnistuneesti!")
-    print("💡 Avaa website/index.html selaimessa nähdäksesi tuloksen.")
\ No newline at end of file
+    if args.watch:
+        watch(interval=args.interval, workers=args.workers)
+    else:
+        update_website(incremental=not args.full, workers=args.workers)
+        print("\n🎉 Verkkosivusto päivitetty onnistuneesti!")
+        print("💡 Avaa website/index.html selaimessa nähdäksesi tuloksen.")
@@ -0,0 +1,230 @@
+"""
+Log Pages - koelokien yhteenvedot sivustolle
+Koostaa logs/prompt_log.csv:n ja logs/day03_advanced_prompts.csv:n kerran
+per build (examples/log_analytics.py, pandas paloittain) ja kirjoittaa
+staattiset sivut per kategoria ja per malli. Latenssi- ja pituuskaaviot
+renderöidään valmiiksi SVG:ksi ja luvut JSON:ksi, joten selain ei käsittele
+raakalokeja. Koosteet välimuistetaan lokin koon ja mtimen mukaan
+(website/.log_cache.json): muuttumaton loki ei edes tuo pandasia.
+"""
+
+import json
+import os
+import sys
+from pathlib import Path
+
+from site_templates import Markup, escape, get_template
+
+# Lokien polut ja skeemat ovat examples/-kansiossa (result_sink on pelkkää stdlibiä)
+sys.path.insert(0, str(Path(__file__).parent.parent / "examples"))
+from result_sink import DAY03_LOG_PATH, PROMPT_LOG_PATH  # noqa: E402
+
+# Nosta kun koosteen sarakkeet muuttuvat: vanha välimuisti hylätään
+CACHE_VERSION = 1
+CACHE_NAME = ".log_cache.json"
+
+LOGS = {
+    'day03': (DAY03_LOG_PATH, "Day 3 — edistyneet promptit"),
+    'prompt': (PROMPT_LOG_PATH, "Day 2 — prompt-testit"),
+}
+PAGES = {
+    'category': ('categories.html', "Kategoriat"),
+    'model': ('models.html', "Mallit"),
+}
+
+# Taulukon sarakkeet: (kenttä, otsikko)
+TABLE_COLUMNS = [
+    ('rows', "Rivejä"),
+    ('errors', "Virheitä"),
+    ('latency_p50_s', "p50 s"),
+    ('latency_p90_s', "p90 s"),
+    ('latency_p99_s', "p99 s"),
+    ('avg_output_chars', "Pituus (merkkiä)"),
+    ('avg_tokens_per_s', "tok/s"),
+    ('avg_distinct_2', "distinct-2"),
+    ('avg_perplexity', "Perplexity"),
+    ('cost_usd', "USD"),
+]
+
+CHART_COLORS = ('#2563eb', '#10b981', '#f59e0b')
+
+
+def log_key(path):
+    """Välimuistiavain: [koko, mtime_ns] tai None, jos lokia ei ole."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _records(table):
+    """DataFrame -> JSON-kelpoiset rivit (ryhmän nimi kentässä 'group', NaN -> None)."""
+    if table.empty:
+        return []
+    table = table.reset_index()
+    table = table.rename(columns={table.columns[0]: 'group'})
+    table = table.astype(object).where(table.notna(), None)
+    return [
+        {key: value.item() if hasattr(value, 'item') else value for key, value in row.items()}
+        for row in table.to_dict('records')
+    ]
+
+
+def summarize(kind, path):
+    """Yhden lokin koosteet ryhmittelyittäin (vaatii pandasin)."""
+    from log_analytics import summarize_log
+
+    tables = summarize_log(kind, path, groupings={grouping: [grouping] for grouping in PAGES})
+    return {grouping: _records(table) for grouping, table in tables.items()}
+
+
+def aggregate_logs(cache_path):
+    """Koosteet kaikista lokeista; palauttaa (koosteet, uudelleen lasketut lokit)."""
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    if cache.get('version') != CACHE_VERSION:
+        cache = {'version': CACHE_VERSION, 'logs': {}}
+
+    summary = {}
+    computed = []
+    for kind, (path, _) in LOGS.items():
+        key = log_key(path)
+        entry = cache['logs'].get(kind)
+        if entry and entry['key'] == key:
+            summary[kind] = entry['tables']
+            continue
+
+        if key is None:
+            tables = {grouping: [] for grouping in PAGES}
+        else:
+            try:
+                tables = summarize(kind, path)
+            except ImportError as e:
+                # Ei välimuistiin: seuraava build yrittää uudelleen
+                print(f"⚠️  {path} ohitetaan ({e}) - pip install pandas")
+                summary[kind] = {grouping: [] for grouping in PAGES}
+                continue
+        cache['logs'][kind] = {'key': key, 'tables': tables}
+        summary[kind] = tables
+        computed.append(kind)
+
+    if computed:
+        tmp_path = Path(str(cache_path) + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False)
+        os.replace(tmp_path, cache_path)
+    return summary, computed
+
+
+def total_rows(summary):
+    """Rivejä kaikissa lokeissa (indexin tilasto)."""
+    return sum(row['rows'] for tables in summary.values() for row in tables.get('model', []))
+
+
+def format_value(value):
+    if value is None:
+        return "–"
+    if isinstance(value, float):
+        return f"{value:.3g}"
+    return str(value)
+
+
+def svg_bar_chart(title, labels, series, unit=""):
+    """Vaakapylväskaavio SVG:nä; series = [(nimi, arvot)], arvo None jätetään pois."""
+    values = [value for _, row in series for value in row if value is not None]
+    if not values:
+        return Markup("")
+
+    width, label_width, bar_height = 640, 170, 14
+    chart_width = width - label_width - 60
+    group_height = len(series) * bar_height + 10
+    height = 40 + len(labels) * group_height + 20
+    peak = max(values) or 1.0
+
+    parts = [
+        f'<svg class="chart" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width} {height}" '
+        f'role="img" aria-label="{escape(title)}">',
+        f'<text x="0" y="16" class="chart-title">{escape(title)}</text>',
+    ]
+    for index, (name, _) in enumerate(series):
+        x = label_width + index * 110
+        parts.append(f'<rect x="{x}" y="24" width="10" height="10" fill="{CHART_COLORS[index]}"/>'
+                     f'<text x="{x + 14}" y="33" class="chart-legend">{escape(name)}</text>')
+    for row, label in enumerate(labels):
+        y = 44 + row * group_height
+        short = label if len(label) <= 24 else label[:23] + "…"
+        parts.append(f'<text x="{label_width - 8}" y="{y + bar_height - 3}" text-anchor="end" '
+                     f'class="chart-label">{escape(short)}</text>')
+        for index, (name, row_values) in enumerate(series):
+            value = row_values[row]
+            if value is None:
+                continue
+            bar_y = y + index * bar_height
+            bar_width = chart_width * value / peak
+            parts.append(f'<rect x="{label_width}" y="{bar_y}" width="{bar_width:.1f}" height="{bar_height - 2}" '
+                         f'fill="{CHART_COLORS[index]}"><title>{escape(label)} {escape(name)}: '
+                         f'{value:.3g} {escape(unit)}</title></rect>')
+            parts.append(f'<text x="{label_width + bar_width + 4:.1f}" y="{bar_y + bar_height - 3}" '
+                         f'class="chart-value">{value:.3g}</text>')
+    parts.append('</svg>')
+    return Markup(''.join(parts))
+
+
+def render_section(title, path, rows):
+    """Yhden lokin osio: kaaviot + taulukko."""
+    labels = [str(row['group']) for row in rows]
+    latency_chart = svg_bar_chart("Latenssi (s)", labels, [
+        ("p50", [row.get('latency_p50_s') for row in rows]),
+        ("p90", [row.get('latency_p90_s') for row in rows]),
+    ], unit="s")
+    length_chart = svg_bar_chart("Vastauksen keskipituus (merkkiä)", labels, [
+        ("merkkiä", [row.get('avg_output_chars') for row in rows]),
+    ])
+
+    header = Markup(''.join(f'<th>{escape(heading)}</th>' for _, heading in TABLE_COLUMNS))
+    row_template = get_template("log_row.html")
+    table_rows = Markup(''.join(
+        row_template.render(
+            group=row['group'],
+            cells=Markup(''.join(f'<td>{escape(format_value(row.get(key)))}</td>' for key, _ in TABLE_COLUMNS)),
+        )
+        for row in rows
+    ))
+    return get_template("log_section.html").render(
+        title=title,
+        path=path,
+        latency_chart=latency_chart,
+        length_chart=length_chart,
+        header=header,
+        table_rows=table_rows if rows else Markup('<tr><td colspan="11">Ei rivejä</td></tr>'),
+    )
+
+
+def build_log_pages(website_dir, write):
+    """Koostaa lokit ja kirjoittaa logs/*.html + logs/summary.json (write = write_if_changed).
+
+    Palauttaa koosteet (indexin tilastoja varten).
+    """
+    logs_dir = Path(website_dir) / "logs"
+    logs_dir.mkdir(exist_ok=True)
+    summary, computed = aggregate_logs(Path(website_dir) / CACHE_NAME)
+
+    nav = Markup(' · '.join(
+        f'<a href="{file_name}">{escape(label)}</a>' for file_name, label in PAGES.values()
+    ))
+    written = 0
+    for grouping, (file_name, label) in PAGES.items():
+        sections = Markup(''.join(
+            render_section(title, path, summary[kind][grouping]) for kind, (path, title) in LOGS.items()
+        ))
+        page = get_template("log_summary.html").render(title=label, nav=nav, sections=sections)
+        written += write(logs_dir / file_name, page)
+    written += write(logs_dir / "summary.json", json.dumps(summary, ensure_ascii=False, indent=2, sort_keys=True))
+
+    cached = len(LOGS) - len(computed)
+    print(f"📈 Lokikoosteet: {len(computed)} laskettu, {cached} välimuistista, {written} tiedostoa päivitetty")
+    return summary
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Render Benchmark - sivustogeneraattorin templatejen nopeus
+Monistaa harjoitukset/day*.txt -sisällöt satoihin keinotekoisiin päiviin
+ja mittaa parsinnan + renderöinnin ajan per sivu sekä index.html:n
+renderöinnin. Levylle ei kirjoiteta mitään.
+
+Käyttö: python website/render_benchmark.py [päivien määrä ...]
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+
+from generate_site import discover_sources, generate_day_page, generate_index, parse_day_content, read_source
+
+DEFAULT_DAY_COUNTS = (100, 500)
+
+
+def synthetic_days(count):
+    """count päivää: oikeiden lähteiden sisällöt kierrätettynä, päivänumerot 1..count"""
+    contents = [read_source(path)[0] for path in discover_sources().values()]
+    return {day_num: contents[(day_num - 1) % len(contents)] for day_num in range(1, count + 1)}
+
+
+def run(count):
+    days = synthetic_days(count)
+
+    start = time.perf_counter()
+    days_data = {day_num: parse_day_content(content) for day_num, content in days.items()}
+    parsed = time.perf_counter()
+    total_bytes = sum(len(generate_day_page(day_num, day_data)) for day_num, day_data in days_data.items())
+    rendered = time.perf_counter()
+    index_bytes = len(generate_index(days_data))
+    indexed = time.perf_counter()
+
+    print(f"📄 {count} päivää: parsinta {(parsed - start) / count * 1000:.3f} ms/sivu, "
+          f"renderöinti {(rendered - parsed) / count * 1000:.3f} ms/sivu "
+          f"({total_bytes / count / 1024:.1f} KB/sivu)")
+    print(f"🏠 index.html: {(indexed - rendered) * 1000:.2f} ms ({index_bytes / 1024:.0f} KB, {count} korttia)")
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or DEFAULT_DAY_COUNTS
+    # Lähteet luetaan projektin juuresta kuten generate_site.py:ssä
+    os.chdir(Path(__file__).parent.parent)
+    print("⏱️  Render benchmark (templates/*.html)")
+    for count in counts:
+        run(count)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Site Templates - käännetyt HTML-templatet sivustogeneraattorille
+Templatet (website/templates/*.html) käyttävät $nimi / ${nimi}
+-paikkamerkkejä. Tiedosto käännetään kerran prosessissa literaali- ja
+kenttäosiksi, joten renderöinti on yksi join ilman regexiä. Arvot
+escapetaan aina; valmis HTML (esim. korttilista) merkitään Markupiksi.
+"""
+
+import hashlib
+import html
+import string
+import threading
+from pathlib import Path
+
+TEMPLATE_DIR = Path(__file__).parent / "templates"
+
+
+class Markup(str):
+    """Valmiiksi turvallinen HTML, jota ei escapeta uudelleen."""
+
+
+def escape(value):
+    """HTML-escape (Markup sellaisenaan)."""
+    if isinstance(value, Markup):
+        return value
+    return Markup(html.escape(str(value), quote=True))
+
+
+class Template:
+    """Kerran käännetty template: render(**context) -> Markup."""
+
+    def __init__(self, source, name="<string>"):
+        self.name = name
+        self.literals = []
+        self.fields = []
+        position = 0
+        for match in string.Template.pattern.finditer(source):
+            if match.group('invalid') is not None:
+                line = source.count('\n', 0, match.start()) + 1
+                raise ValueError(f"Virheellinen paikkamerkki {name}:{line}")
+            literal = source[position:match.start()]
+            position = match.end()
+            if match.group('escaped') is not None:
+                # $$ -> $: liitetään seuraavaan literaaliin
+                self._append_literal(literal + '$')
+                continue
+            self._append_literal(literal)
+            self.fields.append(match.group('named') or match.group('braced'))
+        self._append_literal(source[position:])
+
+    def _append_literal(self, text):
+        # Literaalit ja kentät vuorottelevat: literals[i] ennen fields[i]:tä
+        if len(self.literals) > len(self.fields):
+            self.literals[-1] += text
+        else:
+            self.literals.append(text)
+
+    def render(self, **context):
+        parts = [self.literals[0]]
+        try:
+            for field, literal in zip(self.fields, self.literals[1:]):
+                parts.append(escape(context[field]))
+                parts.append(literal)
+        except KeyError as e:
+            raise KeyError(f"{self.name}: puuttuva arvo {e}") from None
+        return Markup(''.join(parts))
+
+
+_templates = {}
+_templates_lock = threading.Lock()
+
+
+def get_template(name):
+    """Prosessin jaettu, kerran käännetty template nimellä (esim. 'day.html')."""
+    with _templates_lock:
+        template = _templates.get(name)
+        if template is None:
+            source = (TEMPLATE_DIR / name).read_text(encoding='utf-8')
+            template = _templates[name] = Template(source, name)
+        return template
+
+
+def templates_fingerprint():
+    """Hash kaikista templateista: muuttunut template generoi sivut uudelleen."""
+    digest = hashlib.sha256()
+    for path in sorted(TEMPLATE_DIR.glob("*.html")):
+        digest.update(path.name.encode('utf-8'))
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]